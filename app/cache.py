@@ -0,0 +1,181 @@
+"""
+Response caches for the LLM-backed endpoints.
+An in-memory LRU layer bounded by size and TTL, optionally backed by an SQLite
+tier on disk that survives restarts. The disk tier runs in WAL mode so every
+worker process of a multi-worker server reads and writes the same file: a
+result computed by one worker is a disk hit for the others.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from providers import run_blocking
+
+# Path of the on-disk tier; leave unset to keep caches in memory only
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH")
+# Seconds a write waits for another worker's write to finish
+CACHE_DB_BUSY_TIMEOUT = float(os.getenv("CACHE_DB_BUSY_TIMEOUT", "5"))
+# Expired rows are deleted every this many writes
+CACHE_DB_PRUNE_EVERY = 1000
+
+# All caches created through ResponseCache, used for stats reporting
+CACHES = {}
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different prompts share a key."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def make_key(*parts) -> str:
+    """Build a stable cache key from JSON-serializable parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def canonical_vars(dict_of_vars: dict) -> dict:
+    """Canonical form of user variables: stripped names and integral floats as ints."""
+    canonical = {}
+    for name, value in dict_of_vars.items():
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        canonical[str(name).strip()] = value
+    return canonical
+
+class LRUCache:
+    """In-memory LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (time.time() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCache:
+    """
+    Persistent key/value tier with expiry, shared by every ResponseCache namespace
+    and by every worker process using the same path. Each thread gets its own
+    connection; WAL lets readers proceed while another connection writes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT, key TEXT, value TEXT, expires REAL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=CACHE_DB_BUSY_TIMEOUT, check_same_thread=False)
+            # The journal mode is stored in the database file, so the first worker switches it for all
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Durable enough for a cache and avoids an fsync per write
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str):
+        row = self._connect().execute(
+            "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires < time.time():
+            return None
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value, ttl: float):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % CACHE_DB_PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        conn.commit()
+
+_disk = None
+
+def get_disk_tier():
+    """Return the shared SQLite tier, or None when CACHE_DB_PATH is unset."""
+    global _disk
+    if _disk is None and CACHE_DB_PATH:
+        _disk = SQLiteCache(CACHE_DB_PATH)
+    return _disk
+
+class ResponseCache:
+    """Two-tier cache (memory, then optional disk) with hit/miss counters."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 3600, persistent: bool = True):
+        self.name = name
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize, ttl)
+        self.disk = get_disk_tier() if persistent else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        CACHES[name] = self
+
+    async def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.disk is not None:
+            value = await run_blocking(self.disk.get, self.name, key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await run_blocking(self.disk.set, self.name, key, value, self.ttl)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self.memory),
+            "maxsize": self.memory.maxsize,
+            "persistent": self.disk is not None,
+        }
+
+def cache_stats() -> dict:
+    """Hit/miss counters for every registered cache."""
+    return {name: cache.stats() for name, cache in CACHES.items()}
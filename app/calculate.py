@@ -1,19 +1,29 @@
 import json
+import base64
 from dotenv import load_dotenv
 import os
 from prompt2 import get_prompt
 
+from providers import registry, call_provider, run_blocking
+from utils import prepare_image_bytes
+
 load_dotenv()
 groq_api_key = os.getenv("GROQ_API")
-from groq import Groq
+GROQ_VISION_MODEL = os.getenv("GROQ_VISION_MODEL", "llama-3.2-90b-vision-preview")
+
 
-client = Groq(api_key=groq_api_key)
+def get_client():
+    # Built on first use and shared, on the registry's pooled HTTP client
+    from groq import Groq
+    return registry.get("groq_vision", lambda: Groq(api_key=groq_api_key, http_client=registry.http_sync))
 
 
 def analyze_image(img: str, dict_of_vars: str):
     prompt=get_prompt()
-    completion = client.chat.completions.create(
-    model="llama-3.2-90b-vision-preview",
+    if dict_of_vars:
+        prompt += f"\nHere is a dictionary of user-assigned variables. If the given expression has any of these variables, use its actual value from this dictionary accordingly: {dict_of_vars}\n"
+    completion = get_client().chat.completions.create(
+    model=GROQ_VISION_MODEL,
     messages=[
         {
             "role": "user",
@@ -39,4 +49,31 @@ def analyze_image(img: str, dict_of_vars: str):
     stop=None,
 )
     print(completion.choices[0].message.content)
-    return json.loads(completion.choices[0].message.content)
\ No newline at end of file
+    return json.loads(completion.choices[0].message.content)
+
+
+def to_answers(result: dict) -> list:
+    """Convert the Groq vision JSON into the [{expr, result, assign}] list /calculate returns."""
+    # Solved equations and assignments: one assigned answer per variable
+    variables = (result.get("variables") or []) + (result.get("assignments") or [])
+    if variables:
+        return [
+            {"expr": v.get("variable", ""), "result": v.get("result", v.get("value", "")), "assign": True}
+            for v in variables if isinstance(v, dict)
+        ]
+    expr = result.get("expression") or result.get("problem") or result.get("description") or ""
+    value = result.get("result", result.get("concept", ""))
+    return [{"expr": expr, "result": value, "assign": False}]
+
+
+async def analyze_image_async(img, dict_of_vars: dict, raw: bytes | None = None) -> list:
+    """Fallback for /calculate when Gemini is unavailable: solve the canvas with the Groq vision model."""
+    img_byte_arr = await prepare_image_bytes(img, raw)
+    data_url = "data:image/png;base64," + base64.b64encode(img_byte_arr).decode()
+    dict_of_vars_str = json.dumps(dict_of_vars, ensure_ascii=False)
+    result = await call_provider(
+        "groq",
+        [get_prompt(), img_byte_arr],
+        lambda: run_blocking(analyze_image, data_url, dict_of_vars_str)
+    )
+    return to_answers(result)
@@ -0,0 +1,83 @@
+"""
+Cooperative cancellation of requests whose result nobody will read.
+
+The work of a request runs as a task that is cancelled when the client
+disconnects, or when a newer request supersedes it. Superseding is opt-in: a
+request with an X-Request-Id and a board id cancels the in-flight request of
+the same endpoint and board that carries a different request id (retries
+with the same id do not cancel each other). Cancellation reaches the provider
+call through single-flight, the router and the rate limiter queue, so no
+fallback is started and the quota is not spent. Blocking SDK calls already
+running on the thread pool finish in the background; their result is dropped.
+
+The latest request per endpoint and board is tracked in this process only.
+With several workers (WEB_CONCURRENCY > 1) a request supersedes only the ones
+the same worker is serving, so a board's requests must be routed to one
+worker (e.g. sticky load balancing on X-Board-Id) for superseding to apply.
+Disconnect cancellation works on any worker.
+"""
+import asyncio
+import os
+from fastapi import HTTPException, Request
+from metrics import PROVIDER_CANCELLED
+
+# Seconds between checks whether the client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.25"))
+
+CANCELLATION_STATS = {
+    "disconnected": 0,
+    "superseded": 0,
+}
+
+# (endpoint, board id) -> (request id, task, cancel reason) of the latest request, in this worker
+_latest = {}
+
+async def _watch_disconnect(request: Request, task: asyncio.Task, reason: dict):
+    while not task.done():
+        if await request.is_disconnected():
+            reason.setdefault("reason", "disconnected")
+            task.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+async def cancellable(request: Request, work, board_id: str | None = None, request_id: str | None = None):
+    """
+    Await the coroutine `work`, cancelling it when the client goes away (499) or a
+    newer request for the same endpoint and board supersedes it (409).
+    """
+    task = asyncio.ensure_future(work)
+    reason = {}
+    scope = (request.url.path, board_id)
+    if board_id and request_id:
+        previous = _latest.get(scope)
+        if previous is not None and previous[0] != request_id and not previous[1].done():
+            previous[2].setdefault("reason", "superseded")
+            previous[1].cancel()
+        _latest[scope] = (request_id, task, reason)
+    watcher = asyncio.ensure_future(_watch_disconnect(request, task, reason))
+    try:
+        await asyncio.wait({task})
+    except asyncio.CancelledError:
+        # The server is shutting down or the handler itself was cancelled
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+        if _latest.get(scope, (None, None))[1] is task:
+            del _latest[scope]
+
+    if not task.cancelled():
+        return task.result()
+    if reason.get("reason") == "superseded":
+        CANCELLATION_STATS["superseded"] += 1
+        print(f"Request {request_id} for {request.url.path} superseded")
+        raise HTTPException(status_code=409, detail="Superseded by a newer request for this board")
+    CANCELLATION_STATS["disconnected"] += 1
+    print(f"Client disconnected from {request.url.path}, request cancelled")
+    raise HTTPException(status_code=499, detail="Client closed request")
+
+def cancellation_stats() -> dict:
+    cancelled = {}
+    for (provider, stage), count in PROVIDER_CANCELLED.values.items():
+        cancelled.setdefault(provider, {})[stage] = count
+    return {**CANCELLATION_STATS, "in_flight_boards": len(_latest), "provider_calls_cancelled": cancelled}
@@ -0,0 +1,188 @@
+"""
+Incremental analysis of whiteboard canvases.
+
+The canvas is split into regions: groups of ink tiles separated by empty
+space, which on a whiteboard are usually separate expressions. The last frame
+of every board is kept with the answers of each of its regions. When the next
+frame arrives it is diffed tile by tile against the previous one; regions
+without changes keep their answers and only new or changed regions are sent
+to the vision model. Unchanged regions that read a variable assigned in a
+changed or erased region are re-analyzed as well.
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+from PIL import Image, ImageChops
+from preprocess import flatten, background_color, ink_mask
+from local_math import parse, names, Unsupported
+
+# Side of the square tiles the canvas is diffed and segmented on, in pixels
+TILE_SIZE = int(os.getenv("INCREMENTAL_TILE_SIZE", "32"))
+# Empty tiles allowed between two tiles of the same region
+REGION_GAP = int(os.getenv("INCREMENTAL_REGION_GAP", "1"))
+# Background kept around a region when it is cropped for analysis
+REGION_MARGIN = 8
+# Boards with more regions than this are analyzed as a whole canvas
+MAX_REGIONS = int(os.getenv("INCREMENTAL_MAX_REGIONS", "12"))
+# Boards remembered at once and for how long
+MAX_BOARDS = int(os.getenv("INCREMENTAL_MAX_BOARDS", "256"))
+BOARD_TTL = float(os.getenv("INCREMENTAL_BOARD_TTL", "3600"))
+# The ink mask is kept at 1/SIGNATURE_SCALE resolution; tiles whose mask changes by
+# more than DIFF_THRESHOLD are treated as changed
+SIGNATURE_SCALE = 4
+DIFF_THRESHOLD = 24
+
+INCREMENTAL_STATS = {
+    "frames": 0,
+    "full_frames": 0,
+    "regions": 0,
+    "regions_reused": 0,
+    "regions_analyzed": 0,
+    "regions_invalidated": 0,
+    "regions_resolved": 0,
+}
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+class Frame:
+    """Ink signature of a canvas and its regions as tile bounding boxes."""
+
+    def __init__(self, img: Image.Image):
+        rgb = flatten(img)
+        self.size = rgb.size
+        mask = ink_mask(rgb, background_color(rgb))
+        self.signature = mask.reduce(SIGNATURE_SCALE)
+        self.ink_tiles = _tiles_over(mask.reduce(TILE_SIZE), 0)
+        self.regions = group_tiles(self.ink_tiles)
+
+    def changed_tiles(self, previous: "Frame") -> set:
+        """Tiles whose ink differs from `previous` (added or erased strokes)."""
+        diff = ImageChops.difference(self.signature, previous.signature)
+        # Signature pixels per tile; reducing the diff again gives one value per tile
+        per_tile = max(1, TILE_SIZE // SIGNATURE_SCALE)
+        return _tiles_over(diff.point(lambda v: 255 if v > DIFF_THRESHOLD else 0).reduce(per_tile), 0)
+
+    def crop_box(self, region: tuple) -> tuple:
+        """Pixel box of a region, with a small margin, clipped to the canvas."""
+        left, top, right, bottom = region
+        width, height = self.size
+        return (
+            max(0, left * TILE_SIZE - REGION_MARGIN),
+            max(0, top * TILE_SIZE - REGION_MARGIN),
+            min(width, (right + 1) * TILE_SIZE + REGION_MARGIN),
+            min(height, (bottom + 1) * TILE_SIZE + REGION_MARGIN),
+        )
+
+def _tiles_over(grid: Image.Image, threshold: int) -> set:
+    """(column, row) of every pixel of the single-band `grid` above `threshold`."""
+    width = grid.width
+    return {(i % width, i // width) for i, v in enumerate(grid.tobytes()) if v > threshold}
+
+def group_tiles(tiles: set, gap: int = REGION_GAP) -> list:
+    """
+    Group ink tiles that are at most `gap` empty tiles apart into regions, returned
+    as inclusive tile bounding boxes (left, top, right, bottom) in reading order.
+    """
+    remaining = set(tiles)
+    regions = []
+    while remaining:
+        stack = [remaining.pop()]
+        left, top = right, bottom = stack[0]
+        while stack:
+            x, y = stack.pop()
+            left, top, right, bottom = min(left, x), min(top, y), max(right, x), max(bottom, y)
+            for dx in range(-gap - 1, gap + 2):
+                for dy in range(-gap - 1, gap + 2):
+                    neighbour = (x + dx, y + dy)
+                    if neighbour in remaining:
+                        remaining.remove(neighbour)
+                        stack.append(neighbour)
+        regions.append((left, top, right, bottom))
+    return sorted(regions, key=lambda r: (r[1], r[0]))
+
+def touches(region: tuple, tiles: set) -> bool:
+    left, top, right, bottom = region
+    return any(left <= x <= right and top <= y <= bottom for x, y in tiles)
+
+class BoardState:
+    def __init__(self, frame: Frame, answers: dict, dict_of_vars: dict):
+        self.frame = frame
+        # Answer list per region tile box
+        self.answers = answers
+        self.dict_of_vars = dict_of_vars
+        self.updated = time.monotonic()
+
+class BoardSessions:
+    """Last analyzed frame per board, bounded by count (LRU) and age."""
+
+    def __init__(self, maxsize: int = MAX_BOARDS, ttl: float = BOARD_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._boards = OrderedDict()
+
+    def get(self, board_id: str) -> BoardState | None:
+        state = self._boards.get(board_id)
+        if state is None:
+            return None
+        if time.monotonic() - state.updated > self.ttl:
+            del self._boards[board_id]
+            return None
+        self._boards.move_to_end(board_id)
+        return state
+
+    def set(self, board_id: str, state: BoardState):
+        self._boards[board_id] = state
+        self._boards.move_to_end(board_id)
+        while len(self._boards) > self.maxsize:
+            self._boards.popitem(last=False)
+
+    def __len__(self):
+        return len(self._boards)
+
+def plan(frame: Frame, previous: BoardState | None, dict_of_vars: dict) -> tuple[dict, list]:
+    """
+    Split the regions of `frame` into those whose answers can be reused from
+    `previous` ({region: answers}) and those that must be analyzed ([region]).
+    Everything is re-analyzed when the canvas size or the variables changed.
+    """
+    if previous is None or previous.frame.size != frame.size or previous.dict_of_vars != dict_of_vars:
+        return {}, list(frame.regions)
+    changed = frame.changed_tiles(previous.frame)
+    reused = {}
+    for region in frame.regions:
+        answers = previous.answers.get(region)
+        if answers is not None and not touches(region, changed):
+            reused[region] = answers
+
+    # Variables whose value may change: assigned in a region that changed or was erased,
+    # or in a reused region that reads one of them
+    stale = {name for region, answers in previous.answers.items() if region not in reused
+             for name in assigned_vars(answers)}
+    while stale:
+        dependent = [region for region, answers in reused.items() if read_vars(answers) & stale]
+        if not dependent:
+            break
+        INCREMENTAL_STATS["regions_invalidated"] += len(dependent)
+        for region in dependent:
+            stale |= assigned_vars(reused.pop(region)).keys()
+    return reused, [region for region in frame.regions if region not in reused]
+
+def assigned_vars(answers: list) -> dict:
+    """Variables assigned by a region's answers, passed on when solving the other regions."""
+    return {a["expr"]: a["result"] for a in answers if a.get("assign")}
+
+def read_vars(answers: list) -> set:
+    """
+    Variables a region's answers may depend on: the names in its expressions, or every
+    identifier when an expression does not parse. Assignments only show their value,
+    so the identifiers in their steps are taken instead.
+    """
+    read = set()
+    for answer in answers:
+        text = answer.get("steps") if answer.get("assign") else answer.get("expr")
+        try:
+            read |= names(parse(text))
+        except Unsupported:
+            read |= set(IDENTIFIER.findall(str(text or "")))
+    return read
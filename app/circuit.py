@@ -0,0 +1,202 @@
+"""
+Per-provider circuit breakers.
+
+closed    -> calls go through; failures and slow calls are counted over a rolling window
+open      -> calls fail fast with CircuitOpen so callers route straight to their fallback,
+             while a background probe checks whether the provider has recovered
+half_open -> after a successful probe (or the open period without a probe) one real call is
+             let through as a trial while the others keep failing fast; its success closes
+             the breaker, a failure re-opens it
+
+Authentication errors (expired or invalid keys) open the breaker immediately.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from fastapi import HTTPException
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+# Retry-After for calls turned away while the half-open trial call is in flight
+HALF_OPEN_RETRY_SECONDS = 1
+
+class CircuitOpen(HTTPException):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, provider: str, retry_after: float):
+        seconds = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=503,
+            detail=f"{provider} is temporarily unavailable. Please try again later.",
+            headers={"Retry-After": str(seconds)}
+        )
+        self.provider = provider
+
+# Error codes the SDKs put in the message of an authentication failure
+AUTH_ERROR_CODES = ("API_KEY_INVALID", "API key expired", "PERMISSION_DENIED", "UNAUTHENTICATED", "invalid_api_key")
+
+def status_code(exc: Exception) -> int | None:
+    """HTTP status of a failed SDK call: `code` on google-genai errors, `status_code` on Groq/httpx ones."""
+    for value in (getattr(exc, "status_code", None), getattr(exc, "code", None),
+                  getattr(getattr(exc, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+def classify_error(exc: Exception) -> str:
+    """Error class of a failed provider call: auth, timeout, upstream or network."""
+    text = str(exc)
+    if status_code(exc) in (401, 403) or any(code in text for code in AUTH_ERROR_CODES):
+        return "auth"
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)) or "timed out" in text.lower() \
+            or "Timeout" in type(exc).__name__:
+        return "timeout"
+    if "Connect" in type(exc).__name__ or "Connection" in text:
+        return "network"
+    return "upstream"
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker fed by error class and latency."""
+
+    def __init__(self, name: str, window: int = 20, min_failures: int = 5,
+                 failure_rate: float = 0.5, open_seconds: float = 30,
+                 auth_open_seconds: float = 300, slow_call_seconds: float = 20):
+        self.name = name
+        self.window = deque(maxlen=window)
+        self.min_failures = min_failures
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.auth_open_seconds = auth_open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_until = 0.0
+        self.last_error = None
+        self.errors = {}
+        self.short_circuited = 0
+        self.probe = None
+        self._probe_task = None
+        # Whether the half-open trial call is in flight
+        self._trial = False
+        # time.monotonic() of the last recovery, for callers keeping their own error rates
+        self.closed_at = 0.0
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpen if calls to this provider should not be attempted now.
+        Returns True for the half-open trial call, which must end with record_success,
+        record_failure or end_trial.
+        """
+        if self.state == OPEN:
+            if self.probe is None and time.monotonic() >= self.open_until:
+                self.state = HALF_OPEN
+            else:
+                self.short_circuited += 1
+                raise CircuitOpen(self.name, self.open_until - time.monotonic())
+        if self.state == HALF_OPEN:
+            if self._trial:
+                self.short_circuited += 1
+                raise CircuitOpen(self.name, HALF_OPEN_RETRY_SECONDS)
+            self._trial = True
+            return True
+        return False
+
+    def end_trial(self):
+        """The trial call ended without an outcome (cancelled or not admitted); let another one try."""
+        self._trial = False
+
+    @property
+    def available(self) -> bool:
+        return self.state != OPEN
+
+    def record_success(self, elapsed: float):
+        self._trial = False
+        slow = elapsed > self.slow_call_seconds
+        if slow:
+            self.errors["slow"] = self.errors.get("slow", 0) + 1
+        if self.state == HALF_OPEN and not slow:
+            print(f"Circuit for {self.name} closed")
+            self.state = CLOSED
+            self.closed_at = time.monotonic()
+            self.window.clear()
+            return
+        self._record(failed=slow)
+
+    def record_failure(self, exc: Exception, elapsed: float):
+        self._trial = False
+        error_class = classify_error(exc)
+        self.errors[error_class] = self.errors.get(error_class, 0) + 1
+        self.last_error = f"{error_class}: {str(exc)[:200]}"
+        if error_class == "auth":
+            self._open(self.auth_open_seconds)
+        elif self.state == HALF_OPEN:
+            self._open(self.open_seconds)
+        else:
+            self._record(failed=True)
+
+    def _record(self, failed: bool):
+        self.window.append(failed)
+        failures = sum(self.window)
+        if failures >= self.min_failures and failures / len(self.window) >= self.failure_rate:
+            self._open(self.open_seconds)
+
+    def _open(self, seconds: float):
+        if self.state != OPEN:
+            print(f"Circuit for {self.name} opened: {self.last_error}")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.open_until = self.opened_at + seconds
+        self.window.clear()
+        if self.probe is not None and (self._probe_task is None or self._probe_task.done()):
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+
+    async def _probe_loop(self):
+        """Probe the provider in the background until it answers, then half-open the breaker."""
+        while self.state == OPEN:
+            await asyncio.sleep(max(0.0, self.open_until - time.monotonic()))
+            try:
+                await self.probe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Recovery probe for {self.name} failed: {str(e)}")
+                self.last_error = f"{classify_error(e)}: {str(e)[:200]}"
+                self.open_until = time.monotonic() + self.open_seconds
+                continue
+            print(f"Recovery probe for {self.name} succeeded, half-opening circuit")
+            self.state = HALF_OPEN
+
+    def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "open_for_seconds": round(max(0.0, self.open_until - time.monotonic()), 1) if self.state == OPEN else 0,
+            "recent_failures": sum(self.window),
+            "recent_calls": len(self.window),
+            "errors": dict(self.errors),
+            "short_circuited": self.short_circuited,
+            "last_error": self.last_error,
+        }
+
+def breaker_from_env(name: str) -> CircuitBreaker:
+    prefix = name.upper()
+    return CircuitBreaker(
+        name,
+        min_failures=int(os.getenv(f"{prefix}_BREAKER_FAILURES", "5")),
+        open_seconds=float(os.getenv(f"{prefix}_BREAKER_OPEN_SECONDS", "30")),
+        slow_call_seconds=float(os.getenv(f"{prefix}_BREAKER_SLOW_SECONDS", "20"))
+    )
+
+BREAKERS = {
+    "gemini": breaker_from_env("gemini"),
+    "groq": breaker_from_env("groq"),
+}
+
+def breaker_stats() -> dict:
+    return {name: breaker.stats() for name, breaker in BREAKERS.items()}
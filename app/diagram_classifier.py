@@ -0,0 +1,133 @@
+"""
+Fast local classifier that guesses the Mermaid diagram type(s) a prompt asks for,
+so only the relevant reference examples are put into the system prompt.
+Keyword scoring plus character n-gram similarity against the example prompts;
+no network calls.
+"""
+import os
+import re
+from collections import Counter
+from diagram_examples import get_all_examples, VALID_DIAGRAM_TYPES
+
+# Set MERMAID_EXAMPLE_SELECTION=0 to always send every example
+EXAMPLE_SELECTION = os.getenv("MERMAID_EXAMPLE_SELECTION", "1") != "0"
+# Minimum score of the best type before we trust the classifier
+MIN_CONFIDENCE = float(os.getenv("MERMAID_CLASSIFIER_MIN_SCORE", "1.5"))
+# Other types are kept when they score at least this fraction of the best one
+RELATIVE_CUTOFF = 0.5
+MAX_TYPES = 3
+
+# Phrases that name the diagram type outright
+EXPLICIT = {
+    'flowchart': ["flowchart", "flow chart", "flow diagram"],
+    'sequenceDiagram': ["sequence diagram", "sequence"],
+    'classDiagram': ["class diagram", "uml class", "uml"],
+    'stateDiagram': ["state diagram", "state machine", "statechart"],
+    'erDiagram': ["er diagram", "erd", "entity relationship", "entity-relationship"],
+    'gantt': ["gantt"],
+    'pie': ["pie chart", "pie"],
+    'journey': ["journey", "user journey", "customer journey"],
+    'mindmap': ["mind map", "mindmap", "mind-map"],
+    'xychart-beta': ["xy chart", "xychart", "bar chart", "line chart", "bar graph", "line graph"],
+    'gitGraph': ["git graph", "gitgraph", "git"],
+}
+
+# Words that hint at the diagram type
+HINTS = {
+    'flowchart': ["process", "decision", "workflow", "steps", "algorithm", "flow", "procedure"],
+    'sequenceDiagram': ["interaction", "message", "messages", "request", "response", "handshake",
+                        "api call", "conversation", "client", "server", "login"],
+    'classDiagram': ["class", "classes", "inheritance", "object oriented", "oop", "interface",
+                     "attributes", "methods", "inherits"],
+    'stateDiagram': ["state", "states", "transition", "transitions", "lifecycle", "fsm"],
+    'erDiagram': ["entity", "entities", "database", "schema", "table", "tables", "relationship",
+                  "relationships", "foreign key", "e-commerce"],
+    'gantt': ["timeline", "schedule", "project plan", "milestone", "milestones", "roadmap", "sprint",
+              "deadline", "tasks"],
+    'pie': ["share", "percentage", "percentages", "proportion", "proportions", "distribution", "breakdown"],
+    'journey': ["experience", "routine", "onboarding", "satisfaction", "day in the life"],
+    'mindmap': ["brainstorm", "ideas", "concepts", "topics", "overview", "hierarchy", "summary"],
+    'xychart-beta': ["plot", "trend", "over time", "monthly", "yearly", "revenue", "sales", "axis", "chart"],
+    'gitGraph': ["branch", "branches", "commit", "commits", "merge", "rebase", "pull request", "release"],
+}
+
+# Words that appear in almost every prompt and carry no type information
+STOPWORDS = {"create", "make", "draw", "generate", "a", "an", "the", "of", "for", "with",
+             "showing", "show", "diagram", "about", "and", "between", "different", "me", "please"}
+
+# Running totals across requests
+CLASSIFIER_STATS = {
+    "requests": 0,
+    "fallback_full": 0,
+    "prompt_tokens_full": 0,
+    "prompt_tokens_sent": 0,
+}
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(r"(?<![\w-])" + re.escape(phrase) + r"(?![\w-])", text) is not None
+
+def _ngrams(text: str, n: int = 3) -> Counter:
+    words = [w for w in re.findall(r"[a-z0-9-]+", text) if w not in STOPWORDS]
+    joined = " " + " ".join(words) + " "
+    return Counter(joined[i:i + n] for i in range(len(joined) - n + 1))
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[gram] for gram, count in a.items())
+    norm_a = sum(c * c for c in a.values()) ** 0.5
+    norm_b = sum(c * c for c in b.values()) ** 0.5
+    return dot / (norm_a * norm_b)
+
+_example_ngrams = {
+    diagram_type: _ngrams(_normalize(example["prompt"]))
+    for diagram_type, example in get_all_examples().items()
+}
+
+def score_types(prompt: str) -> dict:
+    """Score every valid diagram type for the given user prompt."""
+    text = _normalize(prompt)
+    grams = _ngrams(text)
+    scores = {}
+    for diagram_type in VALID_DIAGRAM_TYPES:
+        score = 3.0 * sum(_contains(text, p) for p in EXPLICIT.get(diagram_type, []))
+        score += 1.0 * sum(_contains(text, p) for p in HINTS.get(diagram_type, []))
+        score += 2.0 * _cosine(grams, _example_ngrams.get(diagram_type, Counter()))
+        scores[diagram_type] = round(score, 3)
+    return scores
+
+def classify(prompt: str) -> list[str] | None:
+    """Likely diagram types for the prompt, best first, or None when confidence is low."""
+    scores = score_types(prompt)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best = ranked[0][1]
+    if best < MIN_CONFIDENCE:
+        return None
+    return [t for t, score in ranked[:MAX_TYPES] if score >= best * RELATIVE_CUTOFF]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+def select_examples(prompt: str) -> dict:
+    """Examples relevant to the prompt, falling back to the full set when unsure."""
+    all_examples = get_all_examples()
+    CLASSIFIER_STATS["requests"] += 1
+    types = classify(prompt) if EXAMPLE_SELECTION else None
+    if types is None:
+        CLASSIFIER_STATS["fallback_full"] += 1
+        return all_examples
+    return {t: all_examples[t] for t in types if t in all_examples}
+
+def record_prompt_size(full_prompt: str, sent_prompt: str):
+    """Track how many prompt tokens example selection saved."""
+    CLASSIFIER_STATS["prompt_tokens_full"] += estimate_tokens(full_prompt)
+    CLASSIFIER_STATS["prompt_tokens_sent"] += estimate_tokens(sent_prompt)
+
+def classifier_stats() -> dict:
+    stats = dict(CLASSIFIER_STATS)
+    stats["prompt_tokens_saved"] = stats["prompt_tokens_full"] - stats["prompt_tokens_sent"]
+    return stats
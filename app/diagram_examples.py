@@ -3,6 +3,13 @@ This file contains example Mermaid diagrams and their corresponding prompts for
 These examples are used to help the AI model generate better diagrams by providing reference patterns.
 """
 
+# Diagram types the generator supports
+VALID_DIAGRAM_TYPES = [
+    'flowchart', 'sequenceDiagram', 'classDiagram',
+    'stateDiagram', 'erDiagram', 'gantt', 'pie', 'journey',
+    'mindmap', 'xychart-beta', 'gitGraph'
+]
+
 DIAGRAM_EXAMPLES = {
     "xychart-beta": {
         "prompt": "Create an XY chart showing monthly sales revenue with both bar and line charts",
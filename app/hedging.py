@@ -0,0 +1,139 @@
+"""
+Hedged and racing requests across a primary and a fallback provider.
+
+Modes:
+- sequential: try the primary, start the fallback only after it fails
+- hedge: start the fallback if the primary has not answered within the hedge delay
+- race: start both at once
+In every mode the first valid result wins and the other call is cancelled.
+"""
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from metrics import FALLBACKS
+
+HEDGE_MODES = ("sequential", "hedge", "race")
+
+class Hedger:
+    """Runs a primary/fallback pair and records which provider wins."""
+
+    def __init__(self, name: str, mode: str = "sequential", delay: str = "auto",
+                 quantile: float = 0.9, default_delay: float = 2.0):
+        if mode not in HEDGE_MODES:
+            raise ValueError(f"Unknown hedge mode: {mode}")
+        self.name = name
+        self.mode = mode
+        # A number of seconds, or "auto" to use the rolling primary latency quantile
+        self.delay = delay
+        self.quantile = quantile
+        self.default_delay = default_delay
+        self.latencies = deque(maxlen=200)
+        self.wins = Counter()
+        self.failures = Counter()
+        self.hedges_fired = 0
+        self.cancelled = 0
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before firing the fallback."""
+        if self.delay != "auto":
+            return float(self.delay)
+        if len(self.latencies) < 20:
+            return self.default_delay
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+
+    async def _timed_primary(self, call):
+        start = time.perf_counter()
+        result = await call()
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def run(self, primary_name: str, primary, fallback_name: str, fallback, mode: str | None = None):
+        """
+        Run zero-argument coroutine functions `primary` and `fallback` according to
+        the mode and return the first successful result. When both fail the
+        fallback's exception is raised.
+        """
+        mode = mode or self.mode
+        if mode not in HEDGE_MODES:
+            raise ValueError(f"Unknown hedge mode: {mode}")
+
+        if mode == "sequential":
+            try:
+                result = await self._timed_primary(primary)
+                self._record_win(primary_name, fallback_name, primary_name)
+                return result
+            except Exception:
+                self.failures[primary_name] += 1
+            try:
+                result = await fallback()
+            except Exception:
+                self.failures[fallback_name] += 1
+                raise
+            self._record_win(primary_name, fallback_name, fallback_name)
+            return result
+
+        names = {}
+        primary_task = asyncio.ensure_future(self._timed_primary(primary))
+        names[primary_task] = primary_name
+        fallback_task = None
+
+        def start_fallback():
+            nonlocal fallback_task
+            fallback_task = asyncio.ensure_future(fallback())
+            names[fallback_task] = fallback_name
+
+        try:
+            if mode == "race":
+                start_fallback()
+            else:
+                done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_delay())
+                if not done:
+                    self.hedges_fired += 1
+                    start_fallback()
+
+            pending = set(names)
+            errors = {}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_win(primary_name, fallback_name, names[task])
+                        return task.result()
+                    errors[names[task]] = task.exception()
+                    self.failures[names[task]] += 1
+                if fallback_task is None:
+                    start_fallback()
+                    pending.add(fallback_task)
+
+            raise errors.get(fallback_name) or errors[primary_name]
+        finally:
+            for task in names:
+                if not task.done():
+                    task.cancel()
+                    self.cancelled += 1
+
+    def _record_win(self, primary_name: str, fallback_name: str, winner: str):
+        self.wins[winner] += 1
+        if winner == fallback_name:
+            FALLBACKS.inc(self.name, primary_name, fallback_name)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "hedge_delay": self.hedge_delay(),
+            "wins": dict(self.wins),
+            "failures": dict(self.failures),
+            "hedges_fired": self.hedges_fired,
+            "cancelled": self.cancelled,
+        }
+
+def hedger_from_env(name: str) -> Hedger:
+    """Build a Hedger configured by <NAME>_HEDGE_MODE and <NAME>_HEDGE_DELAY."""
+    prefix = name.upper()
+    return Hedger(
+        name,
+        mode=os.getenv(f"{prefix}_HEDGE_MODE", "sequential"),
+        delay=os.getenv(f"{prefix}_HEDGE_DELAY", "auto")
+    )
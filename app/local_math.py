@@ -0,0 +1,216 @@
+"""
+Local evaluation of the expressions Gemini read off a canvas.
+
+When the same canvas comes back with different variables, the answers of the
+last analysis are recomputed here instead of asking Gemini again: every
+expression is parsed with a restricted AST evaluator and only the ones that
+depend on a changed variable are re-evaluated. Anything the evaluator cannot
+reproduce (word problems, equations, notation it does not parse) sends the
+canvas back to Gemini.
+"""
+import ast
+import math
+import operator
+
+BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "abs": abs,
+    "round": round,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "exp": math.exp,
+    "log": math.log,
+    "ln": math.log,
+    "log10": math.log10,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "min": min,
+    "max": max,
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+# Handwriting-style operators mapped to Python syntax
+SYMBOLS = {"^": "**", "×": "*", "·": "*", "÷": "/", "−": "-", "π": "pi"}
+# Guards against huge powers and products blocking the event loop: integer results
+# are bounded before they are computed
+MAX_EXPONENT = 1000
+MAX_RESULT_BITS = 4096
+MAX_LENGTH = 200
+# Relative tolerance when checking a local result against Gemini's
+TOLERANCE = 1e-6
+
+LOCAL_MATH_STATS = {
+    "recomputed": 0,
+    "answers_reused": 0,
+    "answers_recomputed": 0,
+    "unsupported": 0,
+}
+
+class Unsupported(ValueError):
+    """The expression uses syntax or names the local evaluator does not handle."""
+
+def parse(expr: str) -> ast.Expression:
+    if not isinstance(expr, str) or len(expr) > MAX_LENGTH:
+        raise Unsupported("expression too long")
+    for symbol, replacement in SYMBOLS.items():
+        expr = expr.replace(symbol, replacement)
+    try:
+        return ast.parse(expr.strip(), mode="eval")
+    except SyntaxError as e:
+        raise Unsupported(str(e))
+
+def names(tree: ast.AST) -> set:
+    """Variables an expression depends on."""
+    return {
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in CONSTANTS
+    }
+
+def check_size(op: ast.operator, left, right, max_bits: int):
+    """Raise Unsupported if an integer power or product would exceed `max_bits` bits."""
+    if type(left) is not int or type(right) is not int:
+        # Float overflow raises OverflowError right away
+        return
+    if isinstance(op, ast.Pow) and right > 0 and abs(left) > 1:
+        bits = abs(left).bit_length() * right
+    elif isinstance(op, ast.Mult):
+        bits = abs(left).bit_length() + abs(right).bit_length()
+    else:
+        return
+    if bits > max_bits:
+        raise Unsupported("result too large")
+
+def evaluate(tree: ast.AST, env: dict, max_bits: int = MAX_RESULT_BITS) -> float:
+    """
+    Evaluate a parsed expression with the numeric variables in `env`. Integer results
+    of more than `max_bits` bits are rejected before they are computed.
+    """
+    if isinstance(tree, ast.Expression):
+        return evaluate(tree.body, env, max_bits)
+    if isinstance(tree, ast.Constant) and type(tree.value) in (int, float):
+        return tree.value
+    if isinstance(tree, ast.Name):
+        if tree.id in env:
+            return env[tree.id]
+        if tree.id in CONSTANTS:
+            return CONSTANTS[tree.id]
+        raise Unsupported(f"unknown variable {tree.id}")
+    if isinstance(tree, ast.BinOp) and type(tree.op) in BINARY_OPS:
+        left, right = evaluate(tree.left, env, max_bits), evaluate(tree.right, env, max_bits)
+        if isinstance(tree.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+            raise Unsupported("exponent too large")
+        check_size(tree.op, left, right, max_bits)
+        return BINARY_OPS[type(tree.op)](left, right)
+    if isinstance(tree, ast.UnaryOp) and type(tree.op) in UNARY_OPS:
+        return UNARY_OPS[type(tree.op)](evaluate(tree.operand, env, max_bits))
+    if (isinstance(tree, ast.Call) and isinstance(tree.func, ast.Name)
+            and tree.func.id in FUNCTIONS and not tree.keywords):
+        return FUNCTIONS[tree.func.id](*(evaluate(arg, env, max_bits) for arg in tree.args))
+    raise Unsupported(f"unsupported syntax {type(tree).__name__}")
+
+def to_number(value):
+    """A variable or result value as a number, or None if it is not numeric."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
+
+def format_number(value: float):
+    if isinstance(value, complex):
+        raise Unsupported("complex result")
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return round(value, 6) if isinstance(value, float) else value
+
+def environment(dict_of_vars: dict, answers: list) -> dict:
+    """Numeric user variables overlaid with the assignments made on the canvas."""
+    env = {name: num for name, value in dict_of_vars.items() if (num := to_number(value)) is not None}
+    for answer in answers:
+        if answer.get("assign"):
+            env[answer["expr"]] = to_number(answer["result"])
+    return env
+
+def same_result(value: float, expected) -> bool:
+    """Whether a local result matches Gemini's, allowing for the precision Gemini rounded to."""
+    number = to_number(expected)
+    if number is None:
+        return False
+    if math.isclose(value, number, rel_tol=TOLERANCE, abs_tol=TOLERANCE):
+        return True
+    text = str(expected).strip()
+    decimals = len(text.partition(".")[2])
+    return "." in text and "e" not in text.lower() and round(value, decimals) == round(number, decimals)
+
+def recompute(answers: list, old_vars: dict, new_vars: dict) -> list | None:
+    """
+    The answers of a canvas analyzed with `old_vars`, recomputed for `new_vars`.
+    Expressions form a dependency graph on the variables: answers that do not
+    depend on a changed variable are returned as they were, dependent ones are
+    re-evaluated locally. Returns None when any answer cannot be handled locally.
+    """
+    try:
+        result = _recompute(answers, old_vars, new_vars)
+    except (Unsupported, ArithmeticError, TypeError, ValueError):
+        result = None
+    if result is None:
+        LOCAL_MATH_STATS["unsupported"] += 1
+    else:
+        LOCAL_MATH_STATS["recomputed"] += 1
+    return result
+
+def _recompute(answers: list, old_vars: dict, new_vars: dict) -> list | None:
+    assignments = [a for a in answers if a.get("assign")]
+    # Solutions of equations are also returned as assignments and may depend on the
+    # user's variables in ways the answers do not show
+    if assignments and old_vars:
+        return None
+    if any(to_number(a["result"]) is None for a in assignments):
+        return None
+
+    old_env = environment(old_vars, answers)
+    new_env = environment(new_vars, answers)
+    changed = {name for name in old_env.keys() | new_env.keys() if old_env.get(name) != new_env.get(name)}
+
+    recomputed = []
+    for answer in answers:
+        if answer.get("assign"):
+            recomputed.append(answer)
+            continue
+        tree = parse(answer["expr"])
+        depends_on = names(tree)
+        # Only trust the local evaluator where it reproduces Gemini's answer
+        if not same_result(evaluate(tree, old_env), answer["result"]):
+            return None
+        if not depends_on & changed:
+            LOCAL_MATH_STATS["answers_reused"] += 1
+            recomputed.append(answer)
+            continue
+        value = format_number(evaluate(tree, new_env))
+        substituted = ", ".join(f"{name} = {format_number(new_env[name])}" for name in sorted(depends_on))
+        LOCAL_MATH_STATS["answers_recomputed"] += 1
+        recomputed.append({
+            **answer,
+            "steps": f"With {substituted}: {answer['expr']} = {value}",
+            "result": value,
+        })
+    return recomputed
@@ -1,20 +1,40 @@
 import os
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Request, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
 from fastapi.middleware.cors import CORSMiddleware
 import base64
 from io import BytesIO
 from PIL import Image
-from utils import analyze_image
-from note_enhance import get_llm
-from fastapi.responses import JSONResponse
+from utils import analyze_image, analyze_images, analyze_image_stream, image_fingerprint
+from preprocess import PREPROCESS_STATS
+from note_enhance import get_llm, get_streaming_llm, gemini_answer, ASK_AI_MODEL
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 import re
-import google.genai as genai
-from google.genai import types
 from diagram_examples import get_all_examples
+from diagram_classifier import select_examples, record_prompt_size, classifier_stats
+from providers import gemini_generate, gemini_stream, ainvoke, astream_text, run_blocking, registry
+from cache import ResponseCache, make_key, normalize_prompt, canonical_vars, cache_stats
+from hedging import hedger_from_env
+from routing import Option, router_from_env, router_stats, ROUTERS
+from singleflight import SingleFlight, flight_stats
+from ratelimit import RateLimited, limiter_stats
+from circuit import CircuitOpen, breaker_stats
+from calculate import analyze_image_async as analyze_image_groq, GROQ_VISION_MODEL
+from local_math import recompute, LOCAL_MATH_STATS
+from quick_answer import quick_answer, quick_answer_stats
+from similarity import SimilarityCache, normalize_question
+from canvas_diff import Frame, BoardSessions, BoardState, plan, assigned_vars, read_vars, MAX_REGIONS, INCREMENTAL_STATS
+from streaming import JsonFieldExtractor, extract_field, sse_event, SSE_OPEN, SSE_HEADERS
+from cancellation import cancellable, cancellation_stats
+from metrics import (
+    render as render_metrics, register_collector, span, current_endpoint,
+    REQUEST_SECONDS, FALLBACKS, PROMPT_SIZE, RESPONSE_SIZE
+)
 
 # Print to verify application start
 print("Application started")
@@ -22,40 +42,178 @@ print("Application started")
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the SDKs and warm the shared provider clients in the background so the
+    # port opens right away; requests arriving first load what they need themselves
+    startup = asyncio.create_task(registry.startup(warmup=os.getenv("PROVIDER_WARMUP", "1") != "0"))
+    yield
+    startup.cancel()
+    await registry.shutdown()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Frontends allowed to call the API; also checked on WebSocket handshakes, which CORS does not cover
+ALLOWED_ORIGINS = ["http://localhost:5173","https://ai-whiteboard.vercel.app"]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:5173","https://ai-whiteboard.vercel.app"],  # Replace "*" with your frontend's origin, e.g., ["http://localhost:5173"]
+    allow_origins=ALLOWED_ORIGINS,  # Replace "*" with your frontend's origin, e.g., ["http://localhost:5173"]
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# Retrieve Groq API key from environment variables
-groq_api_key = os.getenv("GROQ_API")
+class RequestMetricsMiddleware:
+    """
+    Records request latency per route. Plain ASGI rather than @app.middleware("http"),
+    which wraps `receive` so that handlers never see the client disconnect.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Stage spans recorded while handling the request are labelled with its path
+        token = current_endpoint.set(scope["path"])
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            endpoint = route.path if route is not None else "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, scope["method"], str(status))
+            current_endpoint.reset(token)
+
+app.add_middleware(RequestMetricsMiddleware)
+
+# Model names used for diagram generation; part of the cache key
+GEMINI_MODEL = "gemini-2.0-flash"
+GROQ_DIAGRAM_MODEL = "deepseek-r1-distill-llama-70b"
+
+def diagram_llm():
+    """Groq diagram model returning parsed JSON, shared through the provider registry."""
+    return registry.get(
+        "diagram_llm",
+        lambda: registry.groq_chat(GROQ_DIAGRAM_MODEL, 0.7).with_structured_output(dict, method="json_mode")
+    )
+
+def diagram_streaming_llm():
+    """Same model in JSON mode, emitting raw tokens for streaming."""
+    return registry.get(
+        "diagram_streaming_llm",
+        lambda: registry.groq_chat(GROQ_DIAGRAM_MODEL, 0.7).bind(response_format={"type": "json_object"})
+    )
+
+# Bump whenever the Mermaid system prompt, examples or cached value format change so cached
+# diagrams are invalidated
+MERMAID_PROMPT_VERSION = "3"
 
-# Initialize the LLM with ChatGroq
-llm = ChatGroq(
-    temperature=0.7,
-    groq_api_key=groq_api_key,
-    model_name="deepseek-r1-distill-llama-70b"
-).with_structured_output(dict, method="json_mode")
+mermaid_cache = ResponseCache(
+    "mermaid",
+    maxsize=int(os.getenv("MERMAID_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("MERMAID_CACHE_TTL", "86400"))
+)
 
-# Initialize Gemini client
-gemini_client = genai.Client(api_key=os.getenv("GEMINI_API"))
+# Limits for /calculate/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "16"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Batches with up to this many uncached regions are packed into one Gemini request
+BATCH_PACK_MAX = int(os.getenv("BATCH_PACK_MAX", "6"))
+
+# Coalesce identical requests that are in flight at the same time
+mermaid_flight = SingleFlight("mermaid")
+calculate_flight = SingleFlight("calculate")
+answer_flight = SingleFlight("ask_ai")
+
+# Answers reused for rephrasings of earlier questions; ASK_AI_SIMILARITY_THRESHOLD=1 only matches
+# questions that are identical after dropping filler words
+answer_cache = SimilarityCache(
+    "ask_ai",
+    maxsize=int(os.getenv("ASK_AI_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("ASK_AI_CACHE_TTL", "3600")),
+    threshold=float(os.getenv("ASK_AI_SIMILARITY_THRESHOLD", "0.85"))
+)
+# Answers by normalized question in the disk tier, so other workers reuse them
+shared_answers = ResponseCache(
+    "ask_ai",
+    maxsize=int(os.getenv("ASK_AI_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("ASK_AI_CACHE_TTL", "3600"))
+)
+
+def shared_answer_key(question: str) -> str:
+    return make_key(normalize_question(question), ASK_AI_MODEL)
+
+async def recent_answer(question: str) -> str | None:
+    """The answer to this question or a rephrasing of it, from this worker or (exact matches) another one."""
+    answer = answer_cache.get(question)
+    if answer is None and shared_answers.disk is not None and normalize_question(question):
+        answer = await shared_answers.get(shared_answer_key(question))
+        if answer is not None:
+            answer_cache.set(question, answer)
+    return answer
+
+async def remember_answer(question: str, answer: str):
+    answer_cache.set(question, answer)
+    if shared_answers.disk is not None and normalize_question(question):
+        await shared_answers.set(shared_answer_key(question), answer)
+
+# How Groq is hedged against Gemini: MERMAID_HEDGE_MODE=sequential|hedge|race, MERMAID_HEDGE_DELAY=<seconds>|auto
+mermaid_hedger = hedger_from_env("mermaid")
+
+# Providers and models each endpoint can be routed to, with their blended price in USD per
+# million tokens and the latency assumed until they have been measured; see routing.py
+mermaid_router = router_from_env("mermaid", [
+    Option("gemini", GEMINI_MODEL, cost=0.25, prior_latency=3.0),
+    Option("groq", GROQ_DIAGRAM_MODEL, cost=0.87, prior_latency=4.0),
+])
+calculate_router = router_from_env("calculate", [
+    Option("gemini", GEMINI_MODEL, cost=0.25, prior_latency=3.0),
+    Option("groq", GROQ_VISION_MODEL, cost=0.90, prior_latency=5.0),
+])
+ask_ai_router = router_from_env("ask-ai", [
+    Option("groq", ASK_AI_MODEL, cost=0.69, prior_latency=1.0),
+    Option("gemini", GEMINI_MODEL, cost=0.25, prior_latency=1.5),
+])
+
+# Tenants that always race both providers for the lowest latency
+RACE_TENANTS = {t.strip() for t in os.getenv("MERMAID_RACE_TENANTS", "").split(",") if t.strip()}
+
+# Bump whenever the image analysis prompt changes so cached calculations are invalidated
+CALCULATE_PROMPT_VERSION = "1"
+
+calculate_cache = ResponseCache(
+    "calculate",
+    maxsize=int(os.getenv("CALCULATE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("CALCULATE_CACHE_TTL", "3600"))
+)
+
+# Last Gemini answers per canvas regardless of the variables, for local recomputation
+expression_cache = ResponseCache(
+    "calculate_expressions",
+    maxsize=int(os.getenv("CALCULATE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("CALCULATE_CACHE_TTL", "3600"))
+)
 
-# Define valid diagram types globally
-VALID_DIAGRAM_TYPES = [
-    'flowchart', 'sequenceDiagram', 'classDiagram',
-    'stateDiagram', 'erDiagram', 'gantt', 'pie', 'journey',
-    'mindmap', 'xychart-beta', 'gitGraph'
-]
+# Last analyzed frame of each board, for incremental /calculate requests; kept per worker
+board_sessions = BoardSessions()
 
 # Request and Response Models
 class DiagramRequest(BaseModel):
     prompt: str
+    bypass_cache: bool = False
     
 class QuestionData(BaseModel):
     question: str
@@ -64,6 +222,16 @@ class QuestionData(BaseModel):
 class ImageData(BaseModel):
     image: str
     dict_of_vars: dict
+    bypass_cache: bool = False
+    # Set to re-analyze only the parts of the board that changed since its last frame
+    board_id: str | None = None
+
+class BatchImageData(BaseModel):
+    images: list[str]
+    dict_of_vars: dict
+    bypass_cache: bool = False
+    # Pack all regions into one multi-image Gemini request; None decides automatically
+    pack: bool | None = None
 
 class DiagramResponse(BaseModel):
     mermaid_syntax: str
@@ -93,13 +261,98 @@ async def http_exception_handler(request, exc):
         content=ErrorResponse(
             message=exc.detail,
             details=str(exc)
-        ).model_dump()
+        ).model_dump(),
+        headers=exc.headers
     )
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to AI Whiteboard Backend"}
 
+@app.get("/health")
+def read_health():
+    breakers = breaker_stats()
+    healthy = all(b["state"] == "closed" for b in breakers.values())
+    return {"status": "ok" if healthy else "degraded", "breakers": breakers}
+
+@app.get("/cache/stats")
+def read_cache_stats():
+    return cache_stats()
+
+@app.get("/singleflight/stats")
+def read_flight_stats():
+    return flight_stats()
+
+@app.get("/ratelimit/stats")
+def read_limiter_stats():
+    return limiter_stats()
+
+@app.get("/hedge/stats")
+def read_hedge_stats():
+    return {"mermaid": mermaid_hedger.stats()}
+
+@app.get("/classifier/stats")
+def read_classifier_stats():
+    return classifier_stats()
+
+@app.get("/preprocess/stats")
+def read_preprocess_stats():
+    return PREPROCESS_STATS
+
+@app.get("/incremental/stats")
+def read_incremental_stats():
+    return {**INCREMENTAL_STATS, "boards": len(board_sessions)}
+
+@app.get("/local-math/stats")
+def read_local_math_stats():
+    return LOCAL_MATH_STATS
+
+@app.get("/ask-ai/stats")
+def read_quick_answer_stats():
+    return {"fast_path": quick_answer_stats(), "similar_questions": answer_cache.stats()}
+
+@app.get("/ws/stats")
+def read_board_socket_stats():
+    return {**BOARD_SOCKET_STATS, "frames_in_flight": len(board_frames)}
+
+@app.get("/routing/stats")
+def read_router_stats():
+    return router_stats()
+
+@app.get("/cancellation/stats")
+def read_cancellation_stats():
+    return cancellation_stats()
+
+@app.get("/metrics")
+def read_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+register_collector("cache_stat", "Response cache counters", cache_stats)
+register_collector("singleflight_stat", "Request coalescing counters", flight_stats)
+register_collector("ratelimit_stat", "Provider admission control counters", limiter_stats)
+register_collector(
+    "circuit_stat", "Circuit breaker counters (is_open is 1 while calls are short-circuited)",
+    lambda: {name: {**stats, "is_open": stats["state"] == "open"} for name, stats in breaker_stats().items()}
+)
+register_collector("hedge_stat", "Hedged request counters", lambda: {"mermaid": mermaid_hedger.stats()})
+register_collector("classifier_stat", "Diagram classifier counters", lambda: {"mermaid": classifier_stats()})
+register_collector("preprocess_stat", "Canvas preprocessing counters", lambda: {"canvas": PREPROCESS_STATS})
+register_collector("local_math_stat", "Local expression recomputation counters", lambda: {"calculate": LOCAL_MATH_STATS})
+register_collector("quick_answer_stat", "Questions answered locally by the /ask-ai fast path", lambda: {"ask_ai": quick_answer_stats()})
+register_collector("similar_question_stat", "Near-duplicate /ask-ai question cache", lambda: {"ask_ai": answer_cache.stats()})
+register_collector("board_socket_stat", "Whiteboard WebSocket counters", lambda: {"board": read_board_socket_stats()})
+register_collector(
+    "route_stat", "Latency-aware routing per endpoint and provider:model",
+    lambda: {
+        f"{endpoint}/{name}": {**stats, "served": router.served[name]}
+        for endpoint, router in ROUTERS.items() for name, stats in router.stats()["options"].items()
+    }
+)
+register_collector("cancellation_stat", "Requests cancelled because nobody would read the result", lambda: {"requests": {
+    k: v for k, v in cancellation_stats().items() if k != "provider_calls_cancelled"
+}})
+register_collector("incremental_stat", "Incremental canvas analysis counters", lambda: {"canvas": read_incremental_stats()})
+
 def validate_mermaid_syntax(mermaid_code: str) -> bool:
     """Validate if the given string is valid Mermaid syntax."""
     # Basic Mermaid syntax validation
@@ -112,13 +365,92 @@ def validate_mermaid_syntax(mermaid_code: str) -> bool:
     return True
 
 @app.post("/generate-mermaid", response_model=DiagramResponse)
-async def generate_mermaid(data: DiagramRequest):
-    user_prompt = data.prompt
-    
-    example_data = get_all_examples()
-    # Try Gemini first
-    try:
-        gemini_prompt = f"""You are an AI assistant that generates diagrams in Mermaid syntax.
+async def generate_mermaid(request: Request, data: DiagramRequest, x_tenant_id: str | None = Header(None),
+                           x_board_id: str | None = Header(None), x_request_id: str | None = Header(None)):
+    # Abandoned when the client leaves, or when a newer request for the board supersedes it
+    return await cancellable(request, mermaid_response(data, x_tenant_id), x_board_id, x_request_id)
+
+async def mermaid_response(data: DiagramRequest, x_tenant_id: str | None = None) -> DiagramResponse:
+    cache_key = mermaid_cache_key(data.prompt)
+    if not data.bypass_cache:
+        cached = await mermaid_cache.get(cache_key)
+        if cached is not None:
+            return DiagramResponse(mermaid_syntax=cached)
+
+    mode = "race" if x_tenant_id in RACE_TENANTS else None
+
+    async def generate_and_cache():
+        mermaid_syntax = await generate_mermaid_syntax(data.prompt, mode=mode)
+        await mermaid_cache.set(cache_key, mermaid_syntax)
+        return mermaid_syntax
+
+    # Identical prompts already being generated share that call
+    mermaid_syntax = await mermaid_flight.do(cache_key, generate_and_cache)
+    RESPONSE_SIZE.observe(len(mermaid_syntax), "/generate-mermaid")
+    return DiagramResponse(mermaid_syntax=mermaid_syntax)
+
+@app.post("/generate-mermaid/stream")
+async def generate_mermaid_stream(data: DiagramRequest):
+    cache_key = mermaid_cache_key(data.prompt)
+    cached = None if data.bypass_cache else await mermaid_cache.get(cache_key)
+    return StreamingResponse(
+        stream_mermaid(data.prompt, cache_key, cached),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+def mermaid_cache_key(user_prompt: str) -> str:
+    return make_key(
+        normalize_prompt(user_prompt), GEMINI_MODEL, GROQ_DIAGRAM_MODEL, MERMAID_PROMPT_VERSION
+    )
+
+async def stream_mermaid(user_prompt: str, cache_key: str, cached: str | None):
+    """
+    Stream Mermaid syntax as SSE `delta` events followed by a `done` event.
+    Gemini is tried first; Groq takes over only if Gemini fails before any
+    output was sent, since a half-sent diagram cannot be switched mid-stream.
+    """
+    yield SSE_OPEN
+    if cached is not None:
+        yield sse_event({"text": cached}, "delta")
+        yield sse_event({"mermaid_syntax": cached, "cached": True}, "done")
+        return
+
+    system_prompt = mermaid_system_prompt(user_prompt)
+    sources = [
+        ("gemini", lambda: gemini_stream(registry.gemini, **gemini_mermaid_request(system_prompt, user_prompt))),
+        ("groq", lambda: astream_text(diagram_streaming_llm(), [("system", system_prompt), ("human", user_prompt)])),
+    ]
+    for provider, open_stream in sources:
+        extractor = JsonFieldExtractor("mermaid_syntax")
+        raw = ""
+        try:
+            async for chunk in open_stream():
+                raw += chunk
+                text = extractor.feed(chunk)
+                if text:
+                    yield sse_event({"text": text}, "delta")
+        except Exception as e:
+            print(f"{provider} streaming failed: {str(e)}")
+            if extractor.value:
+                yield sse_event({"message": f"Error generating diagram: {str(e)}"}, "error")
+                return
+            continue
+
+        if not validate_mermaid_syntax(extractor.value):
+            print(f"Invalid Mermaid syntax from {provider}. Generated output:\n{raw}")
+            continue
+
+        mermaid_syntax = extractor.value.replace('\\n', '\n')
+        await mermaid_cache.set(cache_key, mermaid_syntax)
+        yield sse_event({"mermaid_syntax": mermaid_syntax}, "done")
+        return
+
+    yield sse_event({"message": "Error generating diagram: no provider returned valid Mermaid syntax"}, "error")
+
+def build_mermaid_prompt(example_data: dict) -> str:
+    """Build the Mermaid system prompt, including the given reference examples."""
+    gemini_prompt = f"""You are an AI assistant that generates diagrams in Mermaid syntax.
         You can create various types of diagrams that are supported by Excalidraw:
         1. Flowcharts (graph/flowchart) - For process flows, decision trees, etc.
         2. Sequence Diagrams - For showing interactions between components
@@ -144,145 +476,430 @@ async def generate_mermaid(data: DiagramRequest):
         9. For charts (pie, xy), include proper data formatting
         10. For git graphs, use proper branch and commit syntax"""
 
-        # Load all example formats into the system prompt
-        if example_data:
-            gemini_prompt += "\n\nHere are some example diagrams for reference:\n"
-            for diagram_type, examples in example_data.items():
-                gemini_prompt += f"\n{diagram_type} diagram example:\n"
-                gemini_prompt += f"Prompt: {examples['prompt']}\n"
-                gemini_prompt += f"Example:\n{examples['example']}\n"
-                gemini_prompt += "Use these as references for syntax and structure, but create new diagrams based on the user's prompt.\n"
-
-        # Configure generation settings for Gemini
-        generate_content_config = types.GenerateContentConfig(
-            response_mime_type="application/json"
-        )
+    # Load all example formats into the system prompt
+    if example_data:
+        gemini_prompt += "\n\nHere are some example diagrams for reference:\n"
+        for diagram_type, examples in example_data.items():
+            gemini_prompt += f"\n{diagram_type} diagram example:\n"
+            gemini_prompt += f"Prompt: {examples['prompt']}\n"
+            gemini_prompt += f"Example:\n{examples['example']}\n"
+            gemini_prompt += "Use these as references for syntax and structure, but create new diagrams based on the user's prompt.\n"
+
+    return gemini_prompt
+
+# System prompt with every example, the baseline for token savings
+FULL_MERMAID_PROMPT = build_mermaid_prompt(get_all_examples())
+
+def mermaid_system_prompt(user_prompt: str) -> str:
+    """System prompt carrying only the examples relevant to the user's request."""
+    with span("prompt_build"):
+        system_prompt = build_mermaid_prompt(select_examples(user_prompt))
+    record_prompt_size(FULL_MERMAID_PROMPT, system_prompt)
+    PROMPT_SIZE.observe(len(system_prompt) + len(user_prompt), current_endpoint.get())
+    return system_prompt
+
+async def generate_mermaid_syntax(user_prompt: str, mode: str | None = None) -> str:
+    """Generate Mermaid syntax with Gemini and Groq according to the hedging mode."""
+    system_prompt = mermaid_system_prompt(user_prompt)
+    with span("provider_call"):
+        try:
+            # The two fastest healthy options become the hedger's primary and fallback
+            return await mermaid_router.run({
+                f"gemini:{GEMINI_MODEL}": lambda: mermaid_from_gemini(system_prompt, user_prompt),
+                f"groq:{GROQ_DIAGRAM_MODEL}": lambda: mermaid_from_groq(system_prompt, user_prompt),
+            }, hedger=mermaid_hedger, mode=mode)
+        except HTTPException:
+            raise
+        except Exception as e:
+            # Gemini can be the last provider tried; fail the same way as with Groq
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error generating diagram: {str(e)}"
+            )
+
+def gemini_mermaid_request(system_prompt: str, user_prompt: str) -> dict:
+    """Keyword arguments for a Gemini Mermaid generation call."""
+    from google.genai import types
+    # Configure generation settings for Gemini
+    generate_content_config = types.GenerateContentConfig(
+        response_mime_type="application/json"
+    )
+    return dict(
+        model=GEMINI_MODEL,
+        contents=[
+            types.Content(
+                role="system",
+                parts=[types.Part.from_text(text=system_prompt)]
+            ),
+            types.Content(
+                role="user",
+                parts=[types.Part.from_text(text=user_prompt)]
+            )
+        ],
+        config=generate_content_config
+    )
+
+async def mermaid_from_gemini(system_prompt: str, user_prompt: str) -> str:
+    try:
         # Generate content using Gemini with separate user prompt
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[
-                types.Content(
-                    role="system",
-                    parts=[types.Part.from_text(text=gemini_prompt)]
-                ),
-                types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=user_prompt)]
-                )
-            ],
-            config=generate_content_config
+        response = await gemini_generate(
+            registry.gemini, **gemini_mermaid_request(system_prompt, user_prompt)
         )
         
-        # Parse the response
-        mermaid_syntax = response.text
-        if not mermaid_syntax:
-            print("Empty response from Gemini, falling back to Groq")
+        # Parse the response; Gemini answers with the JSON object the prompt asks for
+        if not response.text:
+            print("Empty response from Gemini")
             raise ValueError("Empty response from Gemini")
+        mermaid_syntax = extract_field(response.text, "mermaid_syntax").replace('\\n', '\n')
             
         # Validate the Mermaid syntax
         if not validate_mermaid_syntax(mermaid_syntax):
             print(f"Invalid Mermaid syntax from Gemini. Generated syntax:\n{mermaid_syntax}")
             raise ValueError("Invalid Mermaid syntax from Gemini")
             
-        return DiagramResponse(mermaid_syntax=mermaid_syntax)
+        return mermaid_syntax
         
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         # Print the error from Gemini
         print(f"Gemini generation failed: {str(e)}")
         if "API_KEY_INVALID" in str(e) or "API key expired" in str(e):
             print("Gemini API key has expired")
-            
-        print(f"Gemini generation failed: {str(e)}, falling back to Groq")
-        
-        messages = [
-            ("system", gemini_prompt),
-            ("human", user_prompt)
-        ]
+        raise
 
-        try:
-            # Invoke the LLM chain with the user input
-            response = llm.invoke(messages)
-            
-            # Extract Mermaid syntax from the response
-            mermaid_syntax = response.get("mermaid_syntax")
-            if not mermaid_syntax:
-                print("Invalid response format from Groq")
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid response format from AI model"
-                )
-            
-            # Replace escaped newlines with actual newlines
-            mermaid_syntax = mermaid_syntax.replace('\\n', '\n')
-                
-            # Validate the Mermaid syntax
-            if not validate_mermaid_syntax(mermaid_syntax):
-                print(f"Invalid Mermaid syntax from Groq. Generated syntax:\n{mermaid_syntax}")
-                raise HTTPException(
-                    status_code=400,
-                    detail="Groq: Generated Mermaid syntax is invalid. Please try again with a different prompt."
-                )
+async def mermaid_from_groq(system_prompt: str, user_prompt: str) -> str:
+    messages = [
+        ("system", system_prompt),
+        ("human", user_prompt)
+    ]
+
+    try:
+        # Invoke the LLM chain with the user input
+        response = await ainvoke(diagram_llm(), messages)
         
-        except Exception as e:
-            print(f"Groq generation failed: {str(e)}")
-            if isinstance(e, HTTPException):
-                raise e
+        # Extract Mermaid syntax from the response
+        mermaid_syntax = response.get("mermaid_syntax")
+        if not mermaid_syntax:
+            print("Invalid response format from Groq")
             raise HTTPException(
-                status_code=500,
-                detail=f"Error generating diagram: {str(e)}"
+                status_code=400,
+                detail="Invalid response format from AI model"
+            )
+        
+        # Replace escaped newlines with actual newlines
+        mermaid_syntax = mermaid_syntax.replace('\\n', '\n')
+            
+        # Validate the Mermaid syntax
+        if not validate_mermaid_syntax(mermaid_syntax):
+            print(f"Invalid Mermaid syntax from Groq. Generated syntax:\n{mermaid_syntax}")
+            raise HTTPException(
+                status_code=400,
+                detail="Groq: Generated Mermaid syntax is invalid. Please try again with a different prompt."
             )
+    
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"Groq generation failed: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating diagram: {str(e)}"
+        )
 
-        return DiagramResponse(mermaid_syntax=mermaid_syntax)
+    return mermaid_syntax
 
 
-@app.post('/calculate')
-async def run(data: ImageData):
-    try:
-        # Validate input
-        if not data.image or not data.image.startswith('data:image/'):
+# Largest raw canvas accepted by /calculate/upload
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+
+def open_image(image_data: bytes) -> Image.Image:
+    # BytesIO shares the bytes object instead of copying it
+    image = Image.open(BytesIO(image_data))
+    image.load()
+    return image
+
+def decode_image(data_url: str) -> tuple[Image.Image, bytes]:
+    """Decode a base64 data URL into a PIL image, also returning the raw image bytes."""
+    image_data = base64.b64decode(data_url.partition(",")[2])
+    return open_image(image_data), image_data
+
+async def load_canvas(image_url: str) -> tuple[Image.Image, bytes]:
+    """Validate and decode a canvas data URL, raising a 400 on bad input."""
+    # Validate input
+    with span("validate"):
+        if not image_url or not image_url.startswith('data:image/'):
             raise HTTPException(
                 status_code=400,
                 detail="Invalid image data format. Please provide a valid base64 encoded image."
             )
-            
-        # Process image
-        try:
-            image_data = base64.b64decode(data.image.split(",")[1])
-            image_bytes = BytesIO(image_data)
-            image = Image.open(image_bytes)
-        except Exception as e:
+        
+    # Process image
+    try:
+        with span("decode"):
+            return await run_blocking(decode_image, image_url)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error processing image: {str(e)}"
+        )
+
+async def load_canvas_bytes(image_data: bytes) -> tuple[Image.Image, bytes]:
+    """Decode uploaded canvas bytes, raising a 400 on bad input."""
+    if not image_data:
+        raise HTTPException(status_code=400, detail="No image data uploaded")
+    try:
+        with span("decode"):
+            return await run_blocking(open_image, image_data), image_data
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error processing image: {str(e)}"
+        )
+
+async def read_body(request: Request) -> bytes:
+    """Read the request body chunk by chunk into one buffer, rejecting bodies over UPLOAD_MAX_BYTES."""
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > UPLOAD_MAX_BYTES:
             raise HTTPException(
-                status_code=400,
-                detail=f"Error processing image: {str(e)}"
+                status_code=413,
+                detail=f"Image too large (max {UPLOAD_MAX_BYTES} bytes)"
             )
-            
-        # Analyze image
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+def parse_vars(value: str | None) -> dict:
+    """Parse the JSON-encoded variables sent alongside an uploaded canvas."""
+    if not value:
+        return {}
+    try:
+        dict_of_vars = json.loads(value)
+    except ValueError:
+        dict_of_vars = None
+    if not isinstance(dict_of_vars, dict):
+        raise HTTPException(status_code=400, detail="dict_of_vars must be a JSON object")
+    return dict_of_vars
+
+async def canvas_layout_key(image: Image.Image) -> str:
+    """Identifies what is drawn on a canvas (up to anti-aliasing), independently of the variables."""
+    with span("fingerprint"):
+        fingerprint = await run_blocking(image_fingerprint, image)
+    return make_key(fingerprint, GEMINI_MODEL, CALCULATE_PROMPT_VERSION)
+
+def canvas_cache_key(layout_key: str, dict_of_vars: dict) -> str:
+    # Identical canvases with the same variables reuse the last answer
+    return make_key(layout_key, canonical_vars(dict_of_vars))
+
+async def store_answers(layout_key: str, dict_of_vars: dict, responses: list):
+    """Cache Gemini's answers for these variables and as the base for local recomputation."""
+    await calculate_cache.set(canvas_cache_key(layout_key, dict_of_vars), responses)
+    await expression_cache.set(layout_key, {"dict_of_vars": dict_of_vars, "answers": responses})
+
+async def cached_answers(layout_key: str, dict_of_vars: dict) -> list | None:
+    """
+    Answers for a known canvas without calling Gemini: cached for these variables,
+    or recomputed locally from the last analysis when only the variables changed.
+    """
+    cache_key = canvas_cache_key(layout_key, dict_of_vars)
+    responses = await calculate_cache.get(cache_key)
+    if responses is not None:
+        return responses
+    previous = await expression_cache.get(layout_key)
+    if previous is None:
+        return None
+    responses = recompute(previous["answers"], previous["dict_of_vars"], dict_of_vars)
+    if responses is not None:
+        await calculate_cache.set(cache_key, responses)
+    return responses
+
+def analysis_error(e: Exception) -> HTTPException:
+    """Map an error from the vision call to the HTTP error returned to the client."""
+    # Already an HTTP error, e.g. a 429 from the rate limiter
+    if isinstance(e, HTTPException):
+        return e
+    # Upstream quota exhausted despite local limiting
+    if "429" in str(e) and "RESOURCE_EXHAUSTED" in str(e):
+        return RateLimited("gemini", 30)
+    # Check if it's a Gemini API error
+    if "503" in str(e) and "UNAVAILABLE" in str(e):
+        return HTTPException(
+            status_code=503,
+            detail="Gemini API is currently overloaded. Please try again later."
+        )
+    # For other errors from analyze_image
+    return HTTPException(
+        status_code=500,
+        detail=f"Error analyzing image: {str(e)}"
+    )
+
+async def solve_canvas(image: Image.Image, image_data: bytes, dict_of_vars: dict,
+                       bypass_cache: bool = False, layout_key: str | None = None) -> list:
+    """
+    Answers for one canvas: from the cache, recomputed locally when only the
+    variables changed, or from a (coalesced) Gemini call.
+    """
+    layout_key = layout_key or await canvas_layout_key(image)
+    responses = None if bypass_cache else await cached_answers(layout_key, dict_of_vars)
+    if responses is not None:
+        return responses
+
+    async def from_gemini():
+        responses = await analyze_image(image, dict_of_vars=dict_of_vars, raw=image_data)
+        await store_answers(layout_key, dict_of_vars, responses)
+        return responses
+
+    async def from_groq():
+        # The vision model returns a single answer per canvas; keep it out of the cache
+        return await analyze_image_groq(image, dict_of_vars, image_data)
+
+    async def analyze_and_cache():
+        return await calculate_router.run({
+            f"gemini:{GEMINI_MODEL}": from_gemini,
+            f"groq:{GROQ_VISION_MODEL}": from_groq,
+        })
+
+    # Analyze image; retries and duplicate canvases still in flight share one Gemini call
+    try:
+        return await calculate_flight.do(canvas_cache_key(layout_key, dict_of_vars), analyze_and_cache)
+    except Exception as e:
+        raise analysis_error(e)
+
+async def solve_regions(crops: list, dict_of_vars: dict, bypass_cache: bool = False) -> list:
+    """Answer lists for several canvas regions, packing the uncached ones into one request when possible."""
+    layout_keys = await asyncio.gather(*(canvas_layout_key(crop) for crop in crops))
+    results = [None if bypass_cache else await cached_answers(key, dict_of_vars) for key in layout_keys]
+    pending = [i for i, responses in enumerate(results) if responses is None]
+
+    if 2 <= len(pending) <= BATCH_PACK_MAX:
         try:
-            responses = analyze_image(image, dict_of_vars=data.dict_of_vars)
-            if not responses:
-                return {
-                    "status": "success",
-                    "message": "No mathematical expressions found in the image",
-                    "data": []
-                }
-                
-            return {
-                "status": "success",
-                "message": "Image processed successfully",
-                "data": responses
-            }
+            packed = await analyze_images([(crops[i], None) for i in pending], dict_of_vars)
+            for i, responses in zip(pending, packed):
+                await store_answers(layout_keys[i], dict_of_vars, responses)
+                results[i] = responses
+            pending = []
         except Exception as e:
-            # Check if it's a Gemini API error
-            if "503" in str(e) and "UNAVAILABLE" in str(e):
-                raise HTTPException(
-                    status_code=503,
-                    detail="Gemini API is currently overloaded. Please try again later."
-                )
-            # For other errors from analyze_image
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error analyzing image: {str(e)}"
-            )
+            print(f"Packed region request failed, analyzing regions separately: {str(e)}")
+
+    solved = await asyncio.gather(
+        *(solve_canvas(crops[i], None, dict_of_vars, bypass_cache, layout_keys[i]) for i in pending)
+    )
+    for i, responses in zip(pending, solved):
+        results[i] = responses
+    return results
+
+async def solve_board(board_id: str, image: Image.Image, image_data: bytes, dict_of_vars: dict,
+                      bypass_cache: bool = False) -> list:
+    """
+    Answers for the latest frame of a board. Regions unchanged since the board's
+    previous frame keep their answers; only new or changed regions are analyzed.
+    """
+    with span("diff"):
+        frame = await run_blocking(Frame, image)
+    previous = None if bypass_cache else board_sessions.get(board_id)
+    INCREMENTAL_STATS["frames"] += 1
+    INCREMENTAL_STATS["regions"] += len(frame.regions)
+
+    if len(frame.regions) > MAX_REGIONS:
+        # Too fragmented for per-region requests to pay off
+        INCREMENTAL_STATS["full_frames"] += 1
+        responses = await solve_canvas(image, image_data, dict_of_vars, bypass_cache)
+        board_sessions.set(board_id, BoardState(frame, {}, dict_of_vars))
+        return responses
+
+    reused, pending = plan(frame, previous, dict_of_vars)
+    INCREMENTAL_STATS["regions_reused"] += len(reused)
+    INCREMENTAL_STATS["regions_analyzed"] += len(pending)
+
+    # Regions being solved see the variables assigned in the unchanged ones
+    region_vars = dict(dict_of_vars)
+    for answers in reused.values():
+        region_vars.update(assigned_vars(answers))
+
+    def crop(region):
+        return image.crop(frame.crop_box(region))
+
+    solved = await solve_regions([crop(region) for region in pending], region_vars, bypass_cache)
+    answers = {**reused, **dict(zip(pending, solved))}
+    if not await solve_dependent_regions(answers, pending, crop, dict_of_vars, bypass_cache):
+        # Assignments between the changed regions did not settle; let one request see them all
+        INCREMENTAL_STATS["full_frames"] += 1
+        responses = await solve_canvas(image, image_data, dict_of_vars, bypass_cache)
+        board_sessions.set(board_id, BoardState(frame, {}, dict_of_vars))
+        return responses
+    board_sessions.set(board_id, BoardState(frame, answers, dict_of_vars))
+    return [answer for region in frame.regions for answer in answers[region]]
+
+def canvas_vars(answers: dict, region: tuple) -> dict:
+    """Variables assigned on the canvas outside `region` that its answers read."""
+    read = read_vars(answers[region])
+    return {
+        name: value for other, other_answers in answers.items() if other != region
+        for name, value in assigned_vars(other_answers).items() if name in read
+    }
+
+async def solve_dependent_regions(answers: dict, pending: list, crop, dict_of_vars: dict,
+                                  bypass_cache: bool = False) -> bool:
+    """
+    The pending regions were solved independently of each other, with the variables
+    assigned in the reused ones. Solve again, in place in `answers`, every region that
+    reads a variable a pending region assigns, until the values the regions were
+    given stop changing. `crop` returns the image of a region. False if they do not settle.
+    """
+    given = dict(dict_of_vars)
+    for region, region_answers in answers.items():
+        if region not in pending:
+            given.update(assigned_vars(region_answers))
+    solved_with = {region: given for region in answers}
+    for _ in range(len(answers)):
+        redo = {}
+        for region in answers:
+            region_vars = {**dict_of_vars, **canvas_vars(answers, region)}
+            if any(region_vars.get(name) != solved_with[region].get(name) for name in read_vars(answers[region])):
+                redo[region] = region_vars
+        if not redo:
+            return True
+        INCREMENTAL_STATS["regions_resolved"] += len(redo)
+        solved = await asyncio.gather(*(
+            solve_canvas(crop(region), None, region_vars, bypass_cache) for region, region_vars in redo.items()
+        ))
+        for region, responses in zip(redo, solved):
+            answers[region] = responses
+            solved_with[region] = redo[region]
+    return False
+
+def calculation_response(responses: list) -> dict:
+    if not responses:
+        return {
+            "status": "success",
+            "message": "No mathematical expressions found in the image",
+            "data": []
+        }
+        
+    return {
+        "status": "success",
+        "message": "Image processed successfully",
+        "data": responses
+    }
+
+@app.post('/calculate')
+async def run(request: Request, data: ImageData, x_request_id: str | None = Header(None)):
+    # Abandoned when the client leaves, or when a newer frame of the board (X-Request-Id) supersedes it
+    return await cancellable(request, calculate(data), data.board_id, x_request_id)
+
+async def calculate(data: ImageData) -> dict:
+    try:
+        image, image_data = await load_canvas(data.image)
+        if data.board_id:
+            responses = await solve_board(data.board_id, image, image_data, data.dict_of_vars, data.bypass_cache)
+        else:
+            responses = await solve_canvas(image, image_data, data.dict_of_vars, data.bypass_cache)
+        RESPONSE_SIZE.observe(len(str(responses)), "/calculate")
+        return calculation_response(responses)
         
     except HTTPException as he:
         raise he
@@ -292,17 +909,209 @@ async def run(data: ImageData):
             detail=f"Error processing calculation: {str(e)}"
         )
 
+@app.post('/calculate/stream')
+async def run_stream(data: ImageData):
+    image, image_data = await load_canvas(data.image)
+    return StreamingResponse(
+        stream_calculation(image, image_data, data.dict_of_vars, data.bypass_cache, data.board_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+async def stream_calculation(image: Image.Image, image_data: bytes, dict_of_vars: dict,
+                             bypass_cache: bool = False, board_id: str | None = None):
+    """
+    Stream /calculate answers as SSE `answer` events, each sent as soon as Gemini
+    closes that answer's dict, followed by a `done` event with the full response.
+    """
+    yield SSE_OPEN
+    try:
+        if board_id:
+            # Changed regions are solved as separate requests, so there is no single stream to follow
+            responses = await solve_board(board_id, image, image_data, dict_of_vars, bypass_cache)
+        else:
+            layout_key = await canvas_layout_key(image)
+            responses = None if bypass_cache else await cached_answers(layout_key, dict_of_vars)
+    except HTTPException as he:
+        yield sse_event({"message": he.detail, "status_code": he.status_code}, "error")
+        return
+
+    if responses is not None:
+        for answer in responses:
+            yield sse_event({"answer": answer}, "answer")
+    else:
+        responses = []
+        try:
+            async for answer in analyze_image_stream(image, dict_of_vars, image_data):
+                responses.append(answer)
+                yield sse_event({"answer": answer}, "answer")
+            await store_answers(layout_key, dict_of_vars, responses)
+        except CircuitOpen:
+            # Raised before anything was streamed: answer with Groq vision, uncached
+            print("Gemini circuit open, analyzing image with Groq vision")
+            FALLBACKS.inc("calculate", "gemini", "groq_vision")
+            try:
+                responses = await analyze_image_groq(image, dict_of_vars, image_data)
+            except Exception as e:
+                error = analysis_error(e)
+                yield sse_event({"message": error.detail, "status_code": error.status_code}, "error")
+                return
+            for answer in responses:
+                yield sse_event({"answer": answer}, "answer")
+        except Exception as e:
+            print(f"Error streaming calculation: {str(e)}")
+            error = analysis_error(e)
+            yield sse_event({"message": error.detail, "status_code": error.status_code}, "error")
+            return
+
+    RESPONSE_SIZE.observe(len(str(responses)), "/calculate/stream")
+    yield sse_event(calculation_response(responses), "done")
+
+@app.post('/calculate/upload')
+async def run_upload(request: Request, bypass_cache: bool = False,
+                     x_dict_of_vars: str | None = Header(None), x_board_id: str | None = Header(None),
+                     x_request_id: str | None = Header(None)):
+    """
+    /calculate with the canvas sent as raw bytes instead of a base64 data URL.
+    Either the request body is the image (application/octet-stream or image/*)
+    and the variables are a JSON object in the X-Dict-Of-Vars header, or the
+    body is multipart form data with an `image` file and a `dict_of_vars` field.
+    An X-Board-Id header turns on incremental analysis as `board_id` does for /calculate.
+    """
+    dict_of_vars = x_dict_of_vars
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("image")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing image file in form data")
+        if upload.size is not None and upload.size > UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image too large (max {UPLOAD_MAX_BYTES} bytes)"
+            )
+        image_data = await upload.read()
+        dict_of_vars = form.get("dict_of_vars", dict_of_vars)
+    else:
+        image_data = await read_body(request)
+
+    dict_of_vars = parse_vars(dict_of_vars)
+
+    async def solve():
+        image, canvas = await load_canvas_bytes(image_data)
+        if x_board_id:
+            return await solve_board(x_board_id, image, canvas, dict_of_vars, bypass_cache)
+        return await solve_canvas(image, canvas, dict_of_vars, bypass_cache)
+
+    responses = await cancellable(request, solve(), x_board_id, x_request_id)
+    RESPONSE_SIZE.observe(len(str(responses)), "/calculate/upload")
+    return calculation_response(responses)
+
+def batch_item_error(exc: HTTPException) -> dict:
+    return {
+        **ErrorResponse(message=exc.detail, details=str(exc)).model_dump(),
+        "status_code": exc.status_code
+    }
+
+@app.post('/calculate/batch')
+async def run_batch(request: Request, data: BatchImageData):
+    return await cancellable(request, calculate_batch(data))
+
+async def calculate_batch(data: BatchImageData) -> dict:
+    if not data.images:
+        raise HTTPException(status_code=400, detail="No images provided")
+    if len(data.images) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images in one batch (max {BATCH_MAX_ITEMS})"
+        )
+
+    results = [None] * len(data.images)
+
+    async def load(index: int, image_url: str):
+        try:
+            canvas = await load_canvas(image_url)
+            return canvas, await canvas_layout_key(canvas[0])
+        except HTTPException as he:
+            results[index] = batch_item_error(he)
+            return None
+
+    loaded = await asyncio.gather(*(load(i, url) for i, url in enumerate(data.images)))
+
+    # Serve cached or locally recomputed regions first; only the rest goes to Gemini
+    pending = []
+    for index, item in enumerate(loaded):
+        if item is None:
+            continue
+        canvas, layout_key = item
+        cached = None if data.bypass_cache else await cached_answers(layout_key, data.dict_of_vars)
+        if cached is not None:
+            results[index] = calculation_response(cached)
+        else:
+            pending.append((index, canvas, layout_key))
+
+    # One multi-image request amortizes the long instruction prompt over several small regions
+    pack = data.pack if data.pack is not None else 2 <= len(pending) <= BATCH_PACK_MAX
+    if pack and len(pending) > 1:
+        try:
+            packed = await analyze_images([canvas for _, canvas, _ in pending], data.dict_of_vars)
+            for (index, _, layout_key), responses in zip(pending, packed):
+                await store_answers(layout_key, data.dict_of_vars, responses)
+                results[index] = calculation_response(responses)
+            pending = []
+        except Exception as e:
+            print(f"Packed batch request failed, analyzing regions separately: {str(e)}")
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def solve(index: int, canvas: tuple, layout_key: str):
+        async with semaphore:
+            try:
+                responses = await solve_canvas(*canvas, data.dict_of_vars, data.bypass_cache, layout_key)
+                results[index] = calculation_response(responses)
+            except HTTPException as he:
+                results[index] = batch_item_error(he)
+
+    await asyncio.gather(*(solve(*item) for item in pending))
+
+    failed = sum(1 for result in results if result["status"] != "success")
+    return {
+        "status": "success",
+        "message": f"Processed {len(results)} images ({failed} failed)",
+        "results": results
+    }
+
 @app.post("/ask-ai")
-async def generate_answer(data: QuestionData):
+async def generate_answer(request: Request, data: QuestionData,
+                          x_board_id: str | None = Header(None), x_request_id: str | None = Header(None)):
+    return await cancellable(request, answer_question(data), x_board_id, x_request_id)
+
+async def answer_question(data: QuestionData) -> AnswerData:
     try:
         question = data.question
         print(f"Received question: {question}")
+
+        # Arithmetic and unit conversions are answered without the LLM
+        answer = quick_answer(question)
+        if answer is None:
+            # A rephrasing of a question answered recently
+            answer = await recent_answer(question)
+        if answer is not None:
+            RESPONSE_SIZE.observe(len(answer), "/ask-ai")
+            return AnswerData(result=answer)
         
         llm_chain = get_llm()
 
         try:
             # Invoke the LLM chain with the user input
-            response = llm_chain.invoke({'question': question})
+            PROMPT_SIZE.observe(len(question), "/ask-ai")
+            with span("provider_call"):
+                response = await answer_flight.do(
+                    make_key(normalize_prompt(question), ASK_AI_MODEL),
+                    lambda: ask_ai_router.run({
+                        f"groq:{ASK_AI_MODEL}": lambda: ainvoke(llm_chain, {'question': question}),
+                        f"gemini:{GEMINI_MODEL}": lambda: gemini_answer(question, GEMINI_MODEL),
+                    })
+                )
             print(f"LLM Response: {response}")
             
             if not isinstance(response, dict):
@@ -320,8 +1129,12 @@ async def generate_answer(data: QuestionData):
                     detail="Invalid response format from AI model"
                 )
         
+            await remember_answer(question, result)
+            RESPONSE_SIZE.observe(len(str(result)), "/ask-ai")
             return AnswerData(result=result)
         
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Error during LLM invocation: {str(e)}")
             if "API" in str(e) and "key" in str(e).lower():
@@ -342,3 +1155,219 @@ async def generate_answer(data: QuestionData):
             status_code=500,
             detail="An unexpected error occurred. Please check server logs."
         )
+
+@app.post("/ask-ai/stream")
+async def generate_answer_stream(data: QuestionData):
+    print(f"Received question (stream): {data.question}")
+    return StreamingResponse(
+        stream_answer(data.question),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+async def stream_answer(question: str):
+    """Stream the answer's `result` field as SSE `delta` events followed by a `done` event."""
+    yield SSE_OPEN
+    answer = quick_answer(question) or await recent_answer(question)
+    if answer is not None:
+        yield sse_event({"result": answer}, "done")
+        return
+    extractor = JsonFieldExtractor("result")
+    try:
+        async for chunk in astream_text(get_streaming_llm(), {'question': question}):
+            text = extractor.feed(chunk)
+            if text:
+                yield sse_event({"text": text}, "delta")
+    except Exception as e:
+        print(f"Error during LLM streaming: {str(e)}")
+        yield sse_event({"message": f"Error generating answer: {str(e)}"}, "error")
+        return
+
+    if not extractor.value:
+        print("No result in streamed response")
+        yield sse_event({"message": "Invalid response format from AI model"}, "error")
+        return
+    await remember_answer(question, extractor.value)
+    yield sse_event({"result": extractor.value}, "done")
+
+# Whiteboard WebSocket: one connection per board session, multiplexing the HTTP endpoints
+BOARD_SOCKET_STATS = {
+    "connections": 0,
+    "open": 0,
+    "messages": 0,
+    "frames": 0,
+    "superseded": 0,
+}
+
+# Calculate frame being solved per board, across connections: (connection, request id, task).
+# Per worker like board_sessions: a new frame only supersedes one on a connection to the same worker.
+board_frames = {}
+
+class BoardSocket:
+    """
+    One whiteboard connection. Text messages are JSON requests
+    {"id", "type": "calculate" | "ask-ai" | "generate-mermaid" | "cancel", ...};
+    a "calculate" message carries `dict_of_vars` and `bypass_cache` and the canvas
+    follows as the next binary frame (a binary frame on its own reuses the last
+    variables). Requests run concurrently and every reply is pushed as soon as
+    it is ready as {"id", "type", "status": "success" | "error" | "cancelled", ...}.
+    A new frame of the board cancels the frame still being solved.
+    """
+
+    def __init__(self, websocket: WebSocket, board_id: str):
+        self.websocket = websocket
+        self.board_id = board_id
+        self.tasks = {}
+        self.dict_of_vars = {}
+        self.bypass_cache = False
+        # Header of the calculate message whose canvas is the next binary frame
+        self.pending_frame = None
+        self.frames = 0
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: dict):
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    def start(self, request_id, kind: str, work) -> asyncio.Task:
+        """Run `work()` as a task and push its result, or the error it raised, to the client."""
+        async def run():
+            current_endpoint.set(f"/ws/board/{kind}")
+            try:
+                message = {"id": request_id, "type": kind, "status": "success", **await work()}
+            except HTTPException as he:
+                message = {"id": request_id, "type": kind, "status": "error",
+                           "message": he.detail, "status_code": he.status_code}
+            except ValidationError as e:
+                message = {"id": request_id, "type": kind, "status": "error",
+                           "message": f"Invalid {kind} message: {e.errors()[0]['msg']}", "status_code": 422}
+            except Exception as e:
+                print(f"Error handling {kind} message on board {self.board_id}: {str(e)}")
+                message = {"id": request_id, "type": kind, "status": "error",
+                           "message": f"Internal server error: {str(e)}", "status_code": 500}
+            finally:
+                if self.tasks.get(request_id) is asyncio.current_task():
+                    del self.tasks[request_id]
+            try:
+                await self.send(message)
+            except Exception:
+                # The client went away while the request was running
+                pass
+
+        task = asyncio.create_task(run(), name=kind)
+        self.tasks[request_id] = task
+        return task
+
+    async def cancel(self, request_id):
+        task = self.tasks.pop(request_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            await self.send({"id": request_id, "type": task.get_name(), "status": "cancelled"})
+
+    async def handle_text(self, text: str):
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            await self.send({"type": "error", "status": "error", "message": "Messages must be JSON objects", "status_code": 400})
+            return
+        BOARD_SOCKET_STATS["messages"] += 1
+        kind = message.get("type")
+        request_id = message.get("id")
+
+        if kind == "calculate":
+            dict_of_vars = message.get("dict_of_vars", self.dict_of_vars)
+            if not isinstance(dict_of_vars, dict):
+                await self.send({"id": request_id, "type": kind, "status": "error",
+                                 "message": "dict_of_vars must be a JSON object", "status_code": 400})
+                return
+            self.dict_of_vars = dict_of_vars
+            self.bypass_cache = bool(message.get("bypass_cache", False))
+            self.pending_frame = request_id
+        elif kind == "ask-ai":
+            self.start(request_id, kind, lambda: self.ask(message))
+        elif kind == "generate-mermaid":
+            self.start(request_id, kind, lambda: self.diagram(message))
+        elif kind == "cancel":
+            await self.cancel(request_id)
+        else:
+            await self.send({"id": request_id, "type": kind, "status": "error",
+                             "message": f"Unknown message type: {kind}", "status_code": 400})
+
+    async def handle_frame(self, image_data: bytes):
+        """Solve a canvas frame, cancelling the older frame of this board if it is still running."""
+        BOARD_SOCKET_STATS["frames"] += 1
+        self.frames += 1
+        request_id = self.pending_frame if self.pending_frame is not None else f"frame-{self.frames}"
+        self.pending_frame = None
+        if len(image_data) > UPLOAD_MAX_BYTES:
+            await self.send({"id": request_id, "type": "calculate", "status": "error",
+                             "message": f"Image too large (max {UPLOAD_MAX_BYTES} bytes)", "status_code": 413})
+            return
+
+        previous = board_frames.get(self.board_id)
+        if previous is not None and not previous[2].done():
+            BOARD_SOCKET_STATS["superseded"] += 1
+            connection, previous_id, _ = previous
+            try:
+                await connection.cancel(previous_id)
+            except Exception:
+                # The older frame's connection is closing
+                pass
+
+        dict_of_vars, bypass_cache = self.dict_of_vars, self.bypass_cache
+        task = self.start(request_id, "calculate", lambda: self.calculate(image_data, dict_of_vars, bypass_cache))
+        board_frames[self.board_id] = (self, request_id, task)
+        task.add_done_callback(lambda t: self._forget_frame(t))
+
+    def _forget_frame(self, task: asyncio.Task):
+        if board_frames.get(self.board_id, (None, None, None))[2] is task:
+            del board_frames[self.board_id]
+
+    async def calculate(self, image_data: bytes, dict_of_vars: dict, bypass_cache: bool) -> dict:
+        image, image_data = await load_canvas_bytes(image_data)
+        responses = await solve_board(self.board_id, image, image_data, dict_of_vars, bypass_cache)
+        RESPONSE_SIZE.observe(len(str(responses)), "/ws/board/calculate")
+        return calculation_response(responses)
+
+    async def ask(self, message: dict) -> dict:
+        answer = await answer_question(QuestionData(question=message.get("question")))
+        return answer.model_dump()
+
+    async def diagram(self, message: dict) -> dict:
+        request = DiagramRequest(prompt=message.get("prompt"), bypass_cache=message.get("bypass_cache", False))
+        response = await mermaid_response(request)
+        return response.model_dump()
+
+    def close(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+
+@app.websocket("/ws/board/{board_id}")
+async def board_socket(websocket: WebSocket, board_id: str):
+    """Persistent whiteboard channel for calculate, ask-ai and generate-mermaid; see BoardSocket."""
+    origin = websocket.headers.get("origin")
+    if origin is not None and origin not in ALLOWED_ORIGINS:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    connection = BoardSocket(websocket, board_id)
+    BOARD_SOCKET_STATS["connections"] += 1
+    BOARD_SOCKET_STATS["open"] += 1
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                await connection.handle_frame(message["bytes"])
+            elif message.get("text") is not None:
+                await connection.handle_text(message["text"])
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Nobody is left to read the results
+        connection.close()
+        BOARD_SOCKET_STATS["open"] -= 1
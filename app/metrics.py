@@ -0,0 +1,144 @@
+"""
+Minimal in-process metrics with Prometheus text exposition for /metrics.
+Counters and histograms are recorded on the hot path; stats already kept by
+the caches, limiters and breakers are exported through collector callbacks.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Route template of the request being handled, used to label stage timings
+current_endpoint = ContextVar("current_endpoint", default="none")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_METRICS = []
+_COLLECTORS = []
+
+def _format_labels(labels: tuple, names: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"'.replace("\n", " ") for name, value in zip(names, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        _METRICS.append(self)
+
+    def inc(self, *labels, value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(labels, self.labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        _METRICS.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(labels, self.labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(labels, self.labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels, self.labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels, self.labels)} {count}")
+        return lines
+
+def register_collector(name: str, help: str, collect):
+    """
+    Export a gauge family computed at scrape time. `collect()` returns a dict of
+    {component: {stat: value}}; numeric values become samples labelled by both.
+    """
+    _COLLECTORS.append((name, help, collect))
+
+def _render_collector(name: str, help: str, collect) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for component, stats in collect().items():
+        for stat, value in stats.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f'{name}{{component="{component}",stat="{stat}"}} {value}')
+            elif isinstance(value, dict):
+                for key, inner in value.items():
+                    if isinstance(inner, (int, float)):
+                        lines.append(f'{name}{{component="{component}",stat="{stat}",key="{key}"}} {inner}')
+    return lines
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for name, help, collect in _COLLECTORS:
+        lines.extend(_render_collector(name, help, collect))
+    return "\n".join(lines) + "\n"
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint", ("endpoint", "method", "status")
+)
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Time spent in each request stage", ("endpoint", "stage")
+)
+PROVIDER_SECONDS = Histogram(
+    "provider_call_duration_seconds", "Upstream LLM call latency", ("provider", "outcome")
+)
+PROVIDER_ERRORS = Counter(
+    "provider_errors_total", "Failed upstream calls by error class", ("provider", "error_class")
+)
+PROVIDER_TOKENS = Counter(
+    "provider_tokens_total", "Token usage reported by or estimated for providers", ("provider", "kind")
+)
+PROVIDER_CANCELLED = Counter(
+    "provider_calls_cancelled_total", "Provider calls abandoned while queued or in flight", ("provider", "stage")
+)
+FALLBACKS = Counter(
+    "provider_fallbacks_total", "Requests answered by a fallback provider", ("endpoint", "from", "to")
+)
+PROMPT_SIZE = Histogram(
+    "prompt_size_chars", "Prompt size sent upstream", ("endpoint",), buckets=SIZE_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    "response_size_chars", "Response size returned to the client", ("endpoint",), buckets=SIZE_BUCKETS
+)
+IMAGE_BYTES = Histogram(
+    "image_bytes", "Canvas bytes before and after preprocessing", ("direction",), buckets=SIZE_BUCKETS
+)
+
+@contextmanager
+def span(stage: str):
+    """Time a stage (validate, decode, prompt_build, provider_call, parse, ...) of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, current_endpoint.get(), stage)
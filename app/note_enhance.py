@@ -1,22 +1,14 @@
-import os
+import json
 from dotenv import load_dotenv
 
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+from providers import registry, gemini_generate
 # Load environment variables
 load_dotenv()
 
-# Retrieve Groq API key from environment variables
-groq_api_key = os.getenv("GROQ_API")
+ASK_AI_MODEL = "llama-3.3-70b-versatile"
 
-# Initialize the LLM with ChatGroq
-llm = ChatGroq(
-    temperature=0.5,
-    groq_api_key=groq_api_key,
-    model_name="llama-3.3-70b-versatile"
-).with_structured_output(dict, method="json_mode")
-
-prompt_template = ChatPromptTemplate([
+# Prompt messages; the template itself is built with the chain on first use
+ASK_AI_MESSAGES = [
     ("system", """
      You are a helpful assistant that respond with the as short as answer to the question if the answer is within one-two words or numbers (if mathematical expresions or equations asked)
      Note : when asked to create/generate a checklist of topic use this syntax with markdown syntax : 
@@ -28,8 +20,35 @@ prompt_template = ChatPromptTemplate([
      }}
      """),
     ("user", "{question}")
-])
+]
+
+def prompt_template():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate(ASK_AI_MESSAGES)
 
 def get_llm():
-    chain = prompt_template | llm
-    return chain
+    # Built once and shared; the underlying ChatGroq uses the registry's pooled clients
+    return registry.get(
+        "ask_ai_chain",
+        lambda: prompt_template() | registry.groq_chat(ASK_AI_MODEL, 0.5).with_structured_output(dict, method="json_mode")
+    )
+
+async def gemini_answer(question: str, model: str) -> dict:
+    """The same question answered by a Gemini model, for when /ask-ai is routed away from Groq."""
+    from google.genai import types
+    # The template escapes literal braces by doubling them
+    instructions = ASK_AI_MESSAGES[0][1].replace("{{", "{").replace("}}", "}")
+    response = await gemini_generate(
+        registry.gemini,
+        model=model,
+        contents=[types.Content(role="user", parts=[types.Part.from_text(text=question)])],
+        config=types.GenerateContentConfig(system_instruction=instructions, response_mime_type="application/json")
+    )
+    return json.loads(response.text)
+
+def get_streaming_llm():
+    # Same model in JSON mode, emitting raw tokens for streaming
+    return registry.get(
+        "ask_ai_streaming_chain",
+        lambda: prompt_template() | registry.groq_chat(ASK_AI_MODEL, 0.5).bind(response_format={"type": "json_object"})
+    )
@@ -0,0 +1,137 @@
+"""
+Preprocessing of whiteboard canvases before they are sent to a vision model.
+Most of a canvas is empty background, so the image is cropped to its ink,
+downscaled and palette-reduced, and the PNG re-encode is skipped entirely when
+the uploaded PNG is already small enough.
+"""
+import os
+import time
+from io import BytesIO
+from PIL import Image, ImageChops, ImageStat
+
+# Set IMAGE_PREPROCESS=0 to send the full canvas as before
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "1") != "0"
+# Longest side, in pixels, of the image sent to the model
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+# Background kept around the ink bounding box
+IMAGE_CROP_MARGIN = int(os.getenv("IMAGE_CROP_MARGIN", "16"))
+# Palette size after quantization; 0 keeps full color
+IMAGE_PALETTE_COLORS = int(os.getenv("IMAGE_PALETTE_COLORS", "16"))
+# An uploaded PNG is sent as-is unless cropping would remove at least this share of its area
+MIN_CROP_SAVING = 0.25
+
+# Running totals across requests
+PREPROCESS_STATS = {
+    "requests": 0,
+    "reencode_skipped": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "encode_seconds": 0.0,
+}
+
+def flatten(img: Image.Image) -> Image.Image:
+    """
+    Return an RGB copy of the image with any transparency composited onto a
+    background that contrasts with the ink (black for light ink, white otherwise).
+    """
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        alpha = rgba.getchannel("A")
+        if alpha.getextrema()[0] == 255:
+            return rgba.convert("RGB")
+        fill = (255, 255, 255)
+        if alpha.getbbox() is not None:
+            luminance = ImageStat.Stat(rgba.convert("L"), mask=alpha).mean[0]
+            if luminance > 127:
+                fill = (0, 0, 0)
+        background = Image.new("RGB", rgba.size, fill)
+        background.paste(rgba, mask=alpha)
+        return background
+    return img.convert("RGB")
+
+def background_color(rgb: Image.Image) -> tuple:
+    """Most common color of the image, taken as the canvas background."""
+    sample = rgb.copy()
+    sample.thumbnail((64, 64))
+    return max(sample.getcolors(64 * 64), key=lambda c: c[0])[1]
+
+def ink_mask(rgb: Image.Image, background: tuple, threshold: int = 48) -> Image.Image:
+    """Binary mask of pixels that differ noticeably from the background."""
+    diff = ImageChops.difference(rgb, Image.new("RGB", rgb.size, background)).convert("L")
+    return diff.point(lambda v: 255 if v > threshold else 0)
+
+def ink_bbox(rgb: Image.Image, margin: int = IMAGE_CROP_MARGIN):
+    """Bounding box of the ink expanded by `margin`, or None for a blank canvas."""
+    bbox = ink_mask(rgb, background_color(rgb)).getbbox()
+    if bbox is None:
+        return None
+    left, top, right, bottom = bbox
+    return (
+        max(0, left - margin),
+        max(0, top - margin),
+        min(rgb.width, right + margin),
+        min(rgb.height, bottom + margin),
+    )
+
+def cap_resolution(img: Image.Image, max_side: int = IMAGE_MAX_SIDE) -> Image.Image:
+    """Downscale so the longest side is at most `max_side`, keeping the aspect ratio."""
+    if max(img.size) <= max_side:
+        return img
+    img = img.copy()
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return img
+
+def reduce_palette(img: Image.Image, colors: int = IMAGE_PALETTE_COLORS) -> Image.Image:
+    """
+    Quantize to an adaptive palette. Median cut keeps each distinct ink color
+    the prompt asks the model to pay attention to, while anti-aliasing shades
+    collapse into their nearest stroke color.
+    """
+    if not colors:
+        return img
+    return img.quantize(colors=colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+
+def prepare_image(img: Image.Image, raw: bytes | None = None) -> tuple[bytes, dict]:
+    """
+    Produce the PNG bytes to send to the vision model, plus a report with the
+    before/after byte counts and the time spent encoding.
+    """
+    start = time.perf_counter()
+    report = {
+        "size_in": img.size,
+        "bytes_in": len(raw) if raw is not None else None,
+        "reencoded": True,
+    }
+
+    if not IMAGE_PREPROCESS:
+        data = encode_png(img)
+    else:
+        rgb = flatten(img)
+        bbox = ink_bbox(rgb)
+        crop_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) if bbox else rgb.width * rgb.height
+        crop_saving = 1 - crop_area / (rgb.width * rgb.height)
+
+        if (raw is not None and img.format == "PNG"
+                and max(img.size) <= IMAGE_MAX_SIDE and crop_saving < MIN_CROP_SAVING):
+            data = raw
+            report["reencoded"] = False
+        else:
+            if bbox is not None:
+                rgb = rgb.crop(bbox)
+            data = encode_png(reduce_palette(cap_resolution(rgb)))
+
+    report["bytes_out"] = len(data)
+    report["encode_seconds"] = round(time.perf_counter() - start, 4)
+
+    PREPROCESS_STATS["requests"] += 1
+    PREPROCESS_STATS["reencode_skipped"] += not report["reencoded"]
+    PREPROCESS_STATS["bytes_in"] += report["bytes_in"] or 0
+    PREPROCESS_STATS["bytes_out"] += report["bytes_out"]
+    PREPROCESS_STATS["encode_seconds"] += report["encode_seconds"]
+    return data, report
+
+def encode_png(img: Image.Image) -> bytes:
+    """Encode a PIL image as PNG bytes."""
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -0,0 +1,309 @@
+"""
+Async access to the Gemini and Groq models used by the endpoints.
+Every provider call made from a request handler goes through this module so that
+a slow LLM call never blocks the uvicorn event loop. The SDKs are imported on
+first use or by the background warmup, keeping them out of the cold start.
+"""
+import asyncio
+import importlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import httpx
+from ratelimit import LIMITERS
+from circuit import BREAKERS, classify_error
+from metrics import PROVIDER_SECONDS, PROVIDER_ERRORS, PROVIDER_TOKENS, PROVIDER_CANCELLED
+
+# Bounded pool for SDK calls that have no native async path and for CPU work
+# (image decode/encode) that would otherwise stall the event loop.
+PROVIDER_THREADS = int(os.getenv("PROVIDER_THREADS", "32"))
+
+# Seconds before an upstream HTTP call is abandoned
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "60"))
+
+GROQ_BASE_URL = "https://api.groq.com"
+GROQ_MODELS_URL = "https://api.groq.com/openai/v1/models"
+WARMUP_GEMINI_MODEL = "gemini-2.0-flash"
+
+# Provider SDKs, which take most of the app's import time
+SDK_MODULES = ("google.genai", "google.genai.types", "langchain_core.prompts", "langchain_groq")
+
+# Tokens reserved for the completion when admitting a call
+OUTPUT_TOKEN_RESERVE = int(os.getenv("PROVIDER_OUTPUT_TOKENS", "1024"))
+# Gemini bills a small image as a fixed number of tokens
+IMAGE_TOKENS = 258
+
+_executor = ThreadPoolExecutor(
+    max_workers=PROVIDER_THREADS,
+    thread_name_prefix="provider"
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the bounded provider thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+def estimate_tokens(value) -> int:
+    """Rough token count of a request payload: text at ~4 characters per token, images at a flat rate."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value) // 4
+    if isinstance(value, (bytes, bytearray)):
+        return IMAGE_TOKENS
+    if isinstance(value, dict):
+        return sum(estimate_tokens(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_tokens(v) for v in value)
+    # genai Content / Part objects
+    parts = getattr(value, "parts", None)
+    if parts is not None:
+        return estimate_tokens(parts)
+    if getattr(value, "inline_data", None) is not None:
+        return IMAGE_TOKENS
+    return estimate_tokens(getattr(value, "text", None))
+
+async def admit(provider: str, payload) -> int:
+    """Wait for the provider's rate limiter to admit a call; returns the tokens reserved."""
+    tokens = estimate_tokens(payload) + OUTPUT_TOKEN_RESERVE
+    try:
+        await LIMITERS[provider].acquire(tokens)
+    except asyncio.CancelledError:
+        PROVIDER_CANCELLED.inc(provider, "queued")
+        raise
+    return tokens
+
+async def call_provider(provider: str, payload, call, usage=None):
+    """
+    Run one provider call: fail fast if its circuit is open, wait for rate-limit
+    admission, then await `call()` and feed the outcome to the breaker.
+    `usage(result)` may return the real token count to correct the limiter.
+    """
+    breaker = BREAKERS[provider]
+    trial = breaker.before_call()
+    try:
+        reserved = await admit(provider, payload)
+    except BaseException:
+        if trial:
+            breaker.end_trial()
+        raise
+    PROVIDER_TOKENS.inc(provider, "estimated", value=reserved)
+    start = time.perf_counter()
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        PROVIDER_SECONDS.observe(time.perf_counter() - start, provider, "cancelled")
+        PROVIDER_CANCELLED.inc(provider, "in_flight")
+        if trial:
+            breaker.end_trial()
+        raise
+    except Exception as e:
+        record_failure(provider, e, time.perf_counter() - start)
+        raise
+    breaker.record_success(time.perf_counter() - start)
+    PROVIDER_SECONDS.observe(time.perf_counter() - start, provider, "success")
+    if usage is not None:
+        LIMITERS[provider].settle(reserved, usage(result))
+    return result
+
+async def stream_provider(provider: str, payload, open_stream):
+    """Streaming counterpart of call_provider; yields the chunks of `open_stream()`."""
+    breaker = BREAKERS[provider]
+    trial = breaker.before_call()
+    try:
+        reserved = await admit(provider, payload)
+    except BaseException:
+        if trial:
+            breaker.end_trial()
+        raise
+    PROVIDER_TOKENS.inc(provider, "estimated", value=reserved)
+    start = time.perf_counter()
+    try:
+        async for chunk in open_stream():
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        PROVIDER_SECONDS.observe(time.perf_counter() - start, provider, "cancelled")
+        PROVIDER_CANCELLED.inc(provider, "in_flight")
+        if trial:
+            breaker.end_trial()
+        raise
+    except Exception as e:
+        record_failure(provider, e, time.perf_counter() - start)
+        raise
+    breaker.record_success(time.perf_counter() - start)
+    PROVIDER_SECONDS.observe(time.perf_counter() - start, provider, "success")
+
+def record_failure(provider: str, exc: Exception, elapsed: float):
+    BREAKERS[provider].record_failure(exc, elapsed)
+    PROVIDER_ERRORS.inc(provider, classify_error(exc))
+    PROVIDER_SECONDS.observe(elapsed, provider, "error")
+
+def _gemini_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    PROVIDER_TOKENS.inc("gemini", "prompt", value=usage.prompt_token_count or 0)
+    PROVIDER_TOKENS.inc("gemini", "completion", value=usage.candidates_token_count or 0)
+    return usage.total_token_count
+
+async def gemini_generate(client, **kwargs):
+    """Call `generate_content` on a genai client without blocking the event loop."""
+    async def call():
+        aio = getattr(client, "aio", None)
+        if aio is not None:
+            return await aio.models.generate_content(**kwargs)
+        return await run_blocking(client.models.generate_content, **kwargs)
+    return await call_provider("gemini", kwargs.get("contents"), call, usage=_gemini_usage)
+
+async def ainvoke(runnable, value, provider: str = "groq"):
+    """Invoke a langchain runnable, preferring its native async path."""
+    async def call():
+        if hasattr(runnable, "ainvoke"):
+            return await runnable.ainvoke(value)
+        return await run_blocking(runnable.invoke, value)
+    return await call_provider(provider, value, call)
+
+async def gemini_stream(client, **kwargs):
+    """Yield text chunks from `generate_content_stream` as they arrive."""
+    async def open_stream():
+        stream = await client.aio.models.generate_content_stream(**kwargs)
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    async for text in stream_provider("gemini", kwargs.get("contents"), open_stream):
+        yield text
+
+async def astream_text(runnable, value, provider: str = "groq"):
+    """Yield text chunks from a langchain runnable that produces message chunks."""
+    async def open_stream():
+        async for chunk in runnable.astream(value):
+            text = getattr(chunk, "content", chunk)
+            if text:
+                yield text
+    async for text in stream_provider(provider, value, open_stream):
+        yield text
+
+class ProviderRegistry:
+    """
+    Owns the Gemini and Groq clients shared by every endpoint. Created once in the
+    FastAPI lifespan: Groq models share pooled keep-alive HTTP clients, Gemini uses
+    a single genai.Client (which keeps its own connection pool), and everything is
+    closed on shutdown. Clients are also created on first use if accessed before
+    startup, e.g. from scripts.
+    """
+
+    def __init__(self):
+        self._gemini = None
+        self._http = None
+        self._http_sync = None
+        self._objects = {}
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=int(os.getenv("PROVIDER_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("PROVIDER_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=30
+        )
+
+    @property
+    def gemini(self):
+        if self._gemini is None:
+            from google import genai
+            self._gemini = genai.Client(api_key=os.getenv("GEMINI_API"))
+        return self._gemini
+
+    @property
+    def http(self) -> "httpx.AsyncClient":
+        """Pooled async HTTP client shared by the Groq models."""
+        if self._http is None:
+            self._http = httpx.AsyncClient(limits=self._limits(), timeout=PROVIDER_TIMEOUT)
+        return self._http
+
+    @property
+    def http_sync(self) -> "httpx.Client":
+        """Pooled sync HTTP client for Groq calls made from the thread pool."""
+        if self._http_sync is None:
+            self._http_sync = httpx.Client(limits=self._limits(), timeout=PROVIDER_TIMEOUT)
+        return self._http_sync
+
+    def get(self, name: str, factory):
+        """Return the shared object registered under `name`, building it on first use."""
+        if name not in self._objects:
+            self._objects[name] = factory()
+        return self._objects[name]
+
+    def groq_chat(self, model_name: str, temperature: float):
+        """Shared ChatGroq model on the pooled HTTP clients."""
+        from langchain_groq import ChatGroq
+        return self.get(
+            f"groq:{model_name}:{temperature}",
+            lambda: ChatGroq(
+                temperature=temperature,
+                groq_api_key=os.getenv("GROQ_API"),
+                model_name=model_name,
+                http_client=self.http_sync,
+                http_async_client=self.http
+            )
+        )
+
+    async def startup(self, warmup: bool = True):
+        """
+        Import the SDKs, create the clients and open connections so the first request
+        skips the imports and the TLS handshake. Run in the background once the app serves.
+        """
+        start = time.perf_counter()
+        try:
+            for name in SDK_MODULES:
+                await run_blocking(importlib.import_module, name)
+            self.gemini
+            self.http
+        except Exception as e:
+            print(f"Loading provider SDKs failed: {str(e)}")
+            return
+        print(f"Provider SDKs loaded in {time.perf_counter() - start:.2f}s")
+        if not warmup:
+            return
+        results = await asyncio.gather(
+            self.http.head(GROQ_BASE_URL),
+            self.gemini.aio.models.get(model=WARMUP_GEMINI_MODEL),
+            return_exceptions=True
+        )
+        for name, result in zip(("groq", "gemini"), results):
+            if isinstance(result, Exception):
+                print(f"Warmup of {name} failed: {str(result)}")
+
+    async def probe_gemini(self):
+        """Cheap authenticated Gemini call used to check recovery."""
+        await self.gemini.aio.models.get(model=WARMUP_GEMINI_MODEL)
+
+    async def probe_groq(self):
+        """Cheap authenticated Groq call used to check recovery."""
+        response = await self.http.get(
+            GROQ_MODELS_URL,
+            headers={"Authorization": f"Bearer {os.getenv('GROQ_API')}"}
+        )
+        response.raise_for_status()
+
+    async def shutdown(self):
+        """Close every pooled client."""
+        for breaker in BREAKERS.values():
+            breaker.close()
+        if self._http is not None:
+            await self._http.aclose()
+        if self._http_sync is not None:
+            self._http_sync.close()
+        if self._gemini is not None:
+            aio = getattr(self._gemini, "aio", None)
+            if hasattr(aio, "aclose"):
+                await aio.aclose()
+            if hasattr(self._gemini, "close"):
+                self._gemini.close()
+        self._gemini = self._http = self._http_sync = None
+        self._objects.clear()
+
+registry = ProviderRegistry()
+
+# Breakers probe recovery in the background through the shared clients
+BREAKERS["gemini"].probe = registry.probe_gemini
+BREAKERS["groq"].probe = registry.probe_groq
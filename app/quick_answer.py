@@ -0,0 +1,214 @@
+"""
+Local answers for trivial /ask-ai questions.
+
+Plain arithmetic ("what is 17*23", "2 to the power of 10") and unit conversions
+("5 km in miles") are answered here without a Groq round trip; anything else
+returns None and goes to the LLM as before.
+"""
+import ast
+import math
+import os
+import re
+from local_math import parse, names, evaluate, format_number, Unsupported
+
+# Set ASK_AI_FAST_PATH=0 to send every question to the LLM
+FAST_PATH_ENABLED = os.getenv("ASK_AI_FAST_PATH", "1") != "0"
+
+QUICK_ANSWER_STATS = {
+    "questions": 0,
+    "arithmetic": 0,
+    "conversions": 0,
+}
+
+# Leading phrases and trailing punctuation around the actual question
+PREFIX = re.compile(
+    r"^(?:please\s+)?(?:what(?:'s|\s+is|\s+are)|how\s+much\s+is|calculate|compute|evaluate|solve|convert)\s+",
+    re.IGNORECASE
+)
+SUFFIX = re.compile(r"\s*(?:=\s*)?\?*\s*$")
+
+# Integer answers beyond this are left to the LLM
+MAX_INTEGER = 10 ** 30
+# Bound on intermediate integer results, checked before they are computed; the size
+# estimate is an upper bound, so leave room above MAX_INTEGER
+MAX_BITS = 2 * MAX_INTEGER.bit_length()
+
+# Spelled-out operators, applied in order
+WORDS = [
+    (re.compile(r"\bsquare\s+root\s+of\s+(\d+(?:\.\d+)?)", re.I), r"sqrt(\1)"),
+    (re.compile(r"(\d+(?:\.\d+)?)\s*%\s+of\s+", re.I), r"\1/100*"),
+    (re.compile(r"\bto\s+the\s+power\s+of\b", re.I), "**"),
+    (re.compile(r"\bsquared\b", re.I), "**2"),
+    (re.compile(r"\bcubed\b", re.I), "**3"),
+    (re.compile(r"\b(?:multiplied\s+by|times)\b", re.I), "*"),
+    (re.compile(r"\b(?:divided\s+by|over)\b", re.I), "/"),
+    (re.compile(r"\bplus\b", re.I), "+"),
+    (re.compile(r"\bminus\b", re.I), "-"),
+    (re.compile(r"\bmod(?:ulo)?\b", re.I), "%"),
+    (re.compile(r"(?<=\d)\s*[xX]\s*(?=\d)"), "*"),
+]
+
+# Conversion factors to a base unit per dimension, with their names and abbreviations
+UNITS = {
+    "length": {
+        ("mm", "millimeter", "millimetre"): 0.001,
+        ("cm", "centimeter", "centimetre"): 0.01,
+        ("m", "meter", "metre"): 1.0,
+        ("km", "kilometer", "kilometre"): 1000.0,
+        ("in", "inch", "inches"): 0.0254,
+        ("ft", "foot", "feet"): 0.3048,
+        ("yd", "yard"): 0.9144,
+        ("mi", "mile"): 1609.344,
+        ("nmi", "nautical mile"): 1852.0,
+    },
+    "mass": {
+        ("mg", "milligram"): 1e-6,
+        ("g", "gram"): 0.001,
+        ("kg", "kilogram", "kilo"): 1.0,
+        ("t", "tonne", "metric ton"): 1000.0,
+        ("oz", "ounce"): 0.028349523125,
+        ("lb", "lbs", "pound"): 0.45359237,
+        ("st", "stone"): 6.35029318,
+    },
+    "time": {
+        ("ms", "millisecond"): 0.001,
+        ("s", "sec", "second"): 1.0,
+        ("min", "minute"): 60.0,
+        ("h", "hr", "hour"): 3600.0,
+        ("day",): 86400.0,
+        ("week",): 604800.0,
+        ("year", "yr"): 31557600.0,
+    },
+    "volume": {
+        ("ml", "milliliter", "millilitre"): 0.001,
+        ("l", "liter", "litre"): 1.0,
+        ("gal", "gallon"): 3.785411784,
+        ("qt", "quart"): 0.946352946,
+        ("pt", "pint"): 0.473176473,
+        ("cup",): 0.2365882365,
+        ("fl oz", "fluid ounce"): 0.0295735295625,
+    },
+    "speed": {
+        ("m/s", "meters per second", "metres per second"): 1.0,
+        ("km/h", "kmh", "kph", "kilometers per hour", "kilometres per hour"): 1 / 3.6,
+        ("mph", "miles per hour"): 0.44704,
+        ("knot", "kn"): 1852 / 3600,
+    },
+    "data": {
+        ("b", "byte"): 1.0,
+        ("kb", "kilobyte"): 1e3,
+        ("mb", "megabyte"): 1e6,
+        ("gb", "gigabyte"): 1e9,
+        ("tb", "terabyte"): 1e12,
+        ("kib", "kibibyte"): 2 ** 10,
+        ("mib", "mebibyte"): 2 ** 20,
+        ("gib", "gibibyte"): 2 ** 30,
+    },
+}
+TEMPERATURES = {
+    ("c", "°c", "celsius", "degrees celsius", "degree celsius"): "C",
+    ("f", "°f", "fahrenheit", "degrees fahrenheit", "degree fahrenheit"): "F",
+    ("k", "kelvin"): "K",
+}
+
+def _unit_index() -> dict:
+    index = {}
+    for dimension, units in UNITS.items():
+        for aliases, factor in units.items():
+            for alias in aliases:
+                index[alias] = (dimension, factor, aliases[0])
+                if len(alias) > 2 and not alias.endswith("s"):
+                    index[alias + "s"] = (dimension, factor, aliases[0])
+    for aliases, scale in TEMPERATURES.items():
+        for alias in aliases:
+            index[alias] = ("temperature", scale, "K" if scale == "K" else f"°{scale}")
+    return index
+
+UNIT_INDEX = _unit_index()
+
+NUMBER = r"(-?\d+(?:,\d{3})*(?:\.\d+)?)"
+UNIT = r"([a-z°/][a-z°/ ]*?)"
+CONVERSION = re.compile(rf"^{NUMBER}\s*{UNIT}\s+(?:in|to|into|as)\s+{UNIT}$", re.IGNORECASE)
+HOW_MANY = re.compile(rf"^how\s+many\s+{UNIT}\s+(?:are\s+)?(?:in|is)\s+{NUMBER}\s*{UNIT}$", re.IGNORECASE)
+
+def _to_kelvin(value: float, scale: str) -> float:
+    if scale == "C":
+        return value + 273.15
+    if scale == "F":
+        return (value - 32) * 5 / 9 + 273.15
+    return value
+
+def _from_kelvin(value: float, scale: str) -> float:
+    if scale == "C":
+        return value - 273.15
+    if scale == "F":
+        return (value - 273.15) * 9 / 5 + 32
+    return value
+
+def _format(value: float) -> str:
+    if abs(value) >= 1e15 or (value and abs(value) < 1e-6):
+        return f"{value:.6g}"
+    rounded = round(value, 6 if abs(value) < 1 else 4)
+    return str(format_number(float(rounded)))
+
+def convert(amount: str, source: str, target: str) -> str | None:
+    """`amount` of the `source` unit in `target` units, or None if the units are unknown or incompatible."""
+    source_unit = UNIT_INDEX.get(source.strip().lower())
+    target_unit = UNIT_INDEX.get(target.strip().lower())
+    if source_unit is None or target_unit is None or source_unit[0] != target_unit[0]:
+        return None
+    value = float(amount.replace(",", ""))
+    if source_unit[0] == "temperature":
+        converted = _from_kelvin(_to_kelvin(value, source_unit[1]), target_unit[1])
+    else:
+        converted = value * source_unit[1] / target_unit[1]
+    return f"{_format(converted)} {target_unit[2]}"
+
+def arithmetic(text: str) -> str | None:
+    """The value of a constant arithmetic expression, or None if `text` is not one."""
+    for pattern, replacement in WORDS:
+        text = pattern.sub(replacement, text)
+    if not re.search(r"\d", text):
+        return None
+    try:
+        tree = parse(text)
+        # A bare number or anything with variables is not an arithmetic question
+        if names(tree) or isinstance(tree.body, ast.Constant):
+            return None
+        value = evaluate(tree, {}, max_bits=MAX_BITS)
+    except (Unsupported, ArithmeticError, TypeError, ValueError):
+        return None
+    if isinstance(value, float):
+        return _format(value) if math.isfinite(value) else None
+    if isinstance(value, int) and abs(value) <= MAX_INTEGER:
+        return str(value)
+    return None
+
+def quick_answer(question: str) -> str | None:
+    """A local answer for an arithmetic or unit conversion question, or None to ask the LLM."""
+    if not FAST_PATH_ENABLED:
+        return None
+    QUICK_ANSWER_STATS["questions"] += 1
+    text = SUFFIX.sub("", PREFIX.sub("", question.strip()))
+    if not text or len(text) > 120:
+        return None
+
+    match = CONVERSION.match(text)
+    if match:
+        answer = convert(*match.groups())
+    else:
+        match = HOW_MANY.match(text)
+        answer = convert(match.group(2), match.group(3), match.group(1)) if match else None
+    if answer is not None:
+        QUICK_ANSWER_STATS["conversions"] += 1
+        return answer
+
+    answer = arithmetic(text)
+    if answer is not None:
+        QUICK_ANSWER_STATS["arithmetic"] += 1
+    return answer
+
+def quick_answer_stats() -> dict:
+    questions = QUICK_ANSWER_STATS["questions"]
+    hits = QUICK_ANSWER_STATS["arithmetic"] + QUICK_ANSWER_STATS["conversions"]
+    return {**QUICK_ANSWER_STATS, "hits": hits, "hit_rate": round(hits / questions, 3) if questions else 0.0}
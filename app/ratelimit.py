@@ -0,0 +1,168 @@
+"""
+Per-provider admission control in front of every Gemini and Groq call.
+Each provider has token buckets for requests/min and tokens/min, a bounded
+FIFO wait queue and a maximum wait; callers that cannot be admitted in time
+get a 429 with Retry-After instead of bursting into upstream throttling.
+
+Limits come from <PROVIDER>_RPM and <PROVIDER>_TPM (0 disables a bucket),
+queueing from <PROVIDER>_MAX_QUEUE and <PROVIDER>_MAX_WAIT (seconds).
+The limits are for the whole server: with WEB_CONCURRENCY worker processes
+each worker admits its share.
+"""
+import asyncio
+import math
+import os
+import time
+from fastapi import HTTPException
+
+# Bucket capacity in seconds of quota, so traffic is spread out instead of bursting
+BURST_SECONDS = float(os.getenv("PROVIDER_BURST_SECONDS", "10"))
+# Worker processes sharing the provider quota
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+class RateLimited(HTTPException):
+    """Raised when a provider call cannot be admitted within the allowed wait."""
+
+    def __init__(self, provider: str, retry_after: float):
+        seconds = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=429,
+            detail=f"Too many requests to {provider}. Please retry in {seconds} seconds.",
+            headers={"Retry-After": str(seconds)}
+        )
+        self.provider = provider
+        self.retry_after = seconds
+
+class TokenBucket:
+    """Refills continuously at `per_minute` units per minute up to its capacity."""
+
+    def __init__(self, per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (requests larger than the capacity wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float):
+        # May go negative for oversized requests; the debt delays later callers
+        self._refill()
+        self.level -= amount
+
+class ProviderLimiter:
+    """Requests/min and tokens/min limits with a bounded wait queue for one provider."""
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0,
+                 max_queue: int = 64, max_wait: float = 10.0):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _wait_time(self, tokens: int) -> float:
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.wait_time(1))
+        if self.tokens is not None:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    def _consume(self, tokens: int):
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None:
+            self.tokens.consume(tokens)
+
+    def _reject(self, retry_after: float):
+        self.rejected += 1
+        raise RateLimited(self.name, retry_after)
+
+    async def acquire(self, tokens: int = 0):
+        """Wait for capacity for one request of about `tokens` tokens, or raise RateLimited."""
+        if not self.enabled:
+            return
+        if not self._lock.locked() and self._wait_time(tokens) <= 0:
+            self._consume(tokens)
+            self.admitted += 1
+            return
+        if self.waiting >= self.max_queue:
+            self._reject(self._wait_time(tokens))
+
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        self.waiting += 1
+        try:
+            # The lock is FIFO, so queued callers are admitted in arrival order
+            try:
+                await asyncio.wait_for(self._lock.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                self._reject(self._wait_time(tokens))
+            try:
+                while True:
+                    wait = self._wait_time(tokens)
+                    if wait <= 0:
+                        break
+                    if time.monotonic() + wait > deadline:
+                        self._reject(wait)
+                    await asyncio.sleep(wait)
+                self._consume(tokens)
+            finally:
+                self._lock.release()
+        finally:
+            self.waiting -= 1
+
+        self.admitted += 1
+        self.wait_seconds += time.monotonic() - start
+
+    def settle(self, estimated: int, actual: int | None):
+        """Correct the token bucket once the real usage of a call is known."""
+        if self.tokens is not None and actual:
+            self.tokens.consume(actual - estimated)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "requests_available": round(self.requests.level, 2) if self.requests else None,
+            "tokens_available": round(self.tokens.level, 2) if self.tokens else None,
+        }
+
+def limiter_from_env(name: str) -> ProviderLimiter:
+    prefix = name.upper()
+    return ProviderLimiter(
+        name,
+        rpm=float(os.getenv(f"{prefix}_RPM", "0")) / WORKERS,
+        tpm=float(os.getenv(f"{prefix}_TPM", "0")) / WORKERS,
+        max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", "64")),
+        max_wait=float(os.getenv(f"{prefix}_MAX_WAIT", "10"))
+    )
+
+LIMITERS = {
+    "gemini": limiter_from_env("gemini"),
+    "groq": limiter_from_env("groq"),
+}
+
+def limiter_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in LIMITERS.items()}
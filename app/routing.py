@@ -0,0 +1,251 @@
+"""
+Latency-aware routing across the providers and models that can serve an endpoint.
+
+Every (endpoint, provider, model) option keeps exponentially weighted moving
+averages of its latency and error rate, starting from a prior latency. Each
+request is sent to the fastest healthy option; the others follow as fallbacks
+in the same order. An option is healthy while its provider's breaker is not
+open and its error EWMA stays below ROUTE_MAX_ERROR_RATE. Measurements fade
+with a half-life of ROUTE_HALF_LIFE_SECONDS: an option demoted for errors or
+latency drifts back to its prior while it gets no traffic, so it is tried
+again, and its error EWMA is cleared when its provider's breaker recovers.
+Local rejections (429 from the rate limiter, 503 from an open breaker) are
+not counted against an option. Exploration is off by default: with
+ROUTE_EXPLORE_RATE above 0 that share of real requests tries another option
+first, which keeps the averages of the options not in use current but serves
+those users from a possibly worse option (e.g. the lossy Groq vision path).
+
+Options can be restricted per endpoint with ROUTE_<ENDPOINT>_ALLOW (comma
+separated "provider:model" or provider names) and ROUTE_<ENDPOINT>_MAX_COST
+(USD per million tokens, blended input/output price; ROUTE_MAX_COST applies
+to every endpoint). Each routed request is logged as one JSON line, also
+appended to ROUTE_LOG_PATH when it is set. The file is written from a
+background thread, never on the event loop.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from collections import Counter, deque
+from circuit import BREAKERS, CircuitOpen
+from metrics import FALLBACKS
+from ratelimit import RateLimited
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = float(os.getenv("ROUTE_EWMA_ALPHA", "0.2"))
+MAX_ERROR_RATE = float(os.getenv("ROUTE_MAX_ERROR_RATE", "0.5"))
+EXPLORE_RATE = float(os.getenv("ROUTE_EXPLORE_RATE", "0"))
+# Age after which a measurement counts half as much against the prior
+HALF_LIFE_SECONDS = float(os.getenv("ROUTE_HALF_LIFE_SECONDS", "300"))
+ROUTE_LOG_PATH = os.getenv("ROUTE_LOG_PATH")
+
+# Decision log; records are queued here and written to ROUTE_LOG_PATH by a listener thread
+decision_log = logging.getLogger("routing.decisions")
+decision_log.propagate = False
+if ROUTE_LOG_PATH:
+    _log_queue = queue.SimpleQueue()
+    decision_log.addHandler(logging.handlers.QueueHandler(_log_queue))
+    decision_log.setLevel(logging.INFO)
+    _log_listener = logging.handlers.QueueListener(_log_queue, logging.FileHandler(ROUTE_LOG_PATH, delay=True))
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+# All routers, used for stats reporting
+ROUTERS = {}
+
+class Option:
+    """One provider/model able to serve an endpoint, with its rolling latency and error rate."""
+
+    def __init__(self, provider: str, model: str, cost: float, prior_latency: float):
+        self.provider = provider
+        self.model = model
+        self.name = f"{provider}:{model}"
+        # Blended USD price per million tokens
+        self.cost = cost
+        # Latency assumed before any call has finished, and what the average fades back to
+        self.prior_latency = prior_latency
+        self._latency = prior_latency
+        self._error_rate = 0.0
+        # time.monotonic() of the last sample
+        self.updated = time.monotonic()
+        self.calls = 0
+        self.failures = 0
+
+    def _weight(self) -> float:
+        """How much the measurements still count against the prior, from 1 (fresh) to 0."""
+        if HALF_LIFE_SECONDS <= 0:
+            return 1.0
+        return 0.5 ** ((time.monotonic() - self.updated) / HALF_LIFE_SECONDS)
+
+    @property
+    def latency(self) -> float:
+        return self.prior_latency + (self._latency - self.prior_latency) * self._weight()
+
+    @property
+    def error_rate(self) -> float:
+        breaker = BREAKERS.get(self.provider)
+        if breaker is not None and breaker.closed_at > self.updated:
+            # The provider has recovered since the failures were measured
+            return 0.0
+        return self._error_rate * self._weight()
+
+    def record(self, elapsed: float | None):
+        """Fold in a successful call's latency, or a failure when `elapsed` is None."""
+        latency, error_rate = self.latency, self.error_rate
+        self.updated = time.monotonic()
+        self.calls += 1
+        failed = elapsed is None
+        self._error_rate = error_rate + EWMA_ALPHA * (failed - error_rate)
+        if failed:
+            self.failures += 1
+            self._latency = latency
+        else:
+            self._latency = latency + EWMA_ALPHA * (elapsed - latency)
+
+    @property
+    def healthy(self) -> bool:
+        breaker = BREAKERS.get(self.provider)
+        return (breaker is None or breaker.available) and self.error_rate < MAX_ERROR_RATE
+
+    def stats(self) -> dict:
+        return {
+            "latency_ewma": round(self.latency, 3),
+            "error_ewma": round(self.error_rate, 3),
+            "healthy": self.healthy,
+            "cost": self.cost,
+            "calls": self.calls,
+            "failures": self.failures,
+        }
+
+class Router:
+    """Orders an endpoint's allowed options by health and latency and runs a request through them."""
+
+    def __init__(self, endpoint: str, options: list, allow: list | None = None, max_cost: float | None = None):
+        self.endpoint = endpoint
+        self.excluded = {}
+        self.options = []
+        for option in options:
+            if allow and option.name not in allow and option.provider not in allow:
+                self.excluded[option.name] = "not allowed"
+            elif max_cost is not None and option.cost > max_cost:
+                self.excluded[option.name] = f"cost {option.cost} > {max_cost}"
+            else:
+                self.options.append(option)
+        if not self.options:
+            raise ValueError(f"No routing options left for {endpoint}: {self.excluded}")
+        self.served = Counter()
+        self.explored = 0
+        self.recent = deque(maxlen=50)
+        ROUTERS[endpoint] = self
+
+    def rank(self) -> list:
+        """Healthy options fastest first, then the unhealthy ones as a last resort."""
+        ranked = sorted(self.options, key=lambda o: (not o.healthy, o.latency))
+        if len(ranked) > 1 and random.random() < EXPLORE_RATE:
+            candidates = [o for o in ranked[1:] if BREAKERS.get(o.provider) is None or BREAKERS[o.provider].available]
+            if candidates:
+                self.explored += 1
+                choice = random.choice(candidates)
+                ranked.remove(choice)
+                ranked.insert(0, choice)
+        return ranked
+
+    def tracked(self, option: Option, call):
+        """`call` wrapped to feed its outcome into the option's averages."""
+        async def run():
+            start = time.perf_counter()
+            try:
+                result = await call()
+            except (asyncio.CancelledError, RateLimited, CircuitOpen):
+                # Cancelled by the caller or a hedge winner, or turned away before reaching
+                # the provider; says nothing about the option
+                raise
+            except Exception:
+                option.record(None)
+                raise
+            option.record(time.perf_counter() - start)
+            return result
+        return run
+
+    async def run(self, calls: dict, hedger=None, mode: str | None = None):
+        """
+        Serve a request with `calls`, zero-argument coroutine functions keyed by
+        option name. Options are tried in ranked order until one succeeds; with a
+        `hedger` the best two are run as its primary and fallback instead.
+        """
+        ranked = [o for o in self.rank() if o.name in calls]
+        decision = {
+            "endpoint": self.endpoint,
+            "order": [o.name for o in ranked],
+            "scores": {o.name: [round(o.latency, 3), round(o.error_rate, 3)] for o in ranked},
+        }
+        start = time.perf_counter()
+        served = None
+        try:
+            if hedger is not None and len(ranked) > 1:
+                primary, fallback = ranked[0], ranked[1]
+                winner = {}
+
+                def attempt(option):
+                    call = self.tracked(option, calls[option.name])
+                    async def run():
+                        result = await call()
+                        winner.setdefault("option", option)
+                        return result
+                    return run
+
+                result = await hedger.run(primary.name, attempt(primary), fallback.name, attempt(fallback), mode=mode)
+                served = winner["option"]
+                return result
+
+            error = None
+            for option in ranked:
+                try:
+                    result = await self.tracked(option, calls[option.name])()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Route {self.endpoint} via {option.name} failed: {str(e)}")
+                    error = e
+                    continue
+                served = option
+                if option is not ranked[0]:
+                    FALLBACKS.inc(self.endpoint, ranked[0].name, option.name)
+                return result
+            raise error
+        finally:
+            decision["served"] = served.name if served is not None else None
+            decision["seconds"] = round(time.perf_counter() - start, 3)
+            if served is not None:
+                self.served[served.name] += 1
+            self._log(decision)
+
+    def _log(self, decision: dict):
+        decision = {"ts": round(time.time(), 3), **decision}
+        self.recent.append(decision)
+        line = json.dumps(decision)
+        print(f"Route decision: {line}")
+        decision_log.info(line)
+
+    def stats(self) -> dict:
+        return {
+            "options": {o.name: o.stats() for o in self.options},
+            "excluded": self.excluded,
+            "served": dict(self.served),
+            "explored": self.explored,
+        }
+
+def router_from_env(endpoint: str, options: list) -> Router:
+    """Build a Router restricted by ROUTE_<ENDPOINT>_ALLOW and ROUTE_<ENDPOINT>_MAX_COST / ROUTE_MAX_COST."""
+    prefix = f"ROUTE_{endpoint.upper().replace('-', '_')}"
+    allow = [name.strip() for name in os.getenv(f"{prefix}_ALLOW", "").split(",") if name.strip()]
+    max_cost = os.getenv(f"{prefix}_MAX_COST") or os.getenv("ROUTE_MAX_COST")
+    return Router(endpoint, options, allow=allow or None, max_cost=float(max_cost) if max_cost else None)
+
+def router_stats() -> dict:
+    return {endpoint: router.stats() for endpoint, router in ROUTERS.items()}
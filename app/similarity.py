@@ -0,0 +1,147 @@
+"""
+Near-duplicate cache for free-text questions.
+
+Questions are compared by TF-IDF weighted character trigrams after dropping
+filler words, so "make a checklist for react hooks" and "create checklist react
+hooks" share an entry while "react hooks" and "vue hooks" do not. Numbers,
+operators and negations must match exactly: "17*23" and "17-23" look alike but
+need different answers. Words both questions share must also come in the same
+order, so "fahrenheit to celsius" never answers "celsius to fahrenheit".
+Everything is in-process; there is no external embedding service.
+"""
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+
+# Words that change the phrasing of a request but not what is asked. Direction
+# ("to", "in") and negation are part of what is asked and are kept.
+FILLER_WORDS = {
+    "a", "an", "the", "for", "of", "on", "about", "me", "my", "please", "can", "could",
+    "you", "would", "i", "want", "need", "make", "create", "generate", "write", "give", "show",
+    "list", "tell", "explain", "describe", "some", "quick", "short", "simple", "what", "is", "are",
+}
+NEGATIONS = {"not", "no", "never", "without", "except"}
+# Words (including "c++", "node.js", "c#") and single operator or symbol characters
+TOKEN = re.compile(r"[a-z0-9]+(?:[.+#][a-z0-9]+)*[+#]*|[-+*/^=<>%!()\[\]{}|&~√π×÷∫∑]")
+# Parts of a question that must be identical for two questions to share an answer
+LITERAL = re.compile(r"\d+(?:\.\d+)?|[-+*/^=<>%!()\[\]{}|&~√π×÷∫∑]|\b(?:" + "|".join(sorted(NEGATIONS)) + r")\b")
+# Candidates scored in full per lookup, picked by the number of trigrams shared with the question
+MAX_CANDIDATES = 32
+
+def normalize_question(text: str) -> str:
+    text = re.sub(r"n't\b", " not", text.lower())
+    return " ".join(t for t in TOKEN.findall(text) if t not in FILLER_WORDS)
+
+def same_order(a: list, b: list) -> bool:
+    """Whether the words two questions have in common appear in the same order in both."""
+    common = set(a) & set(b)
+    return [w for w in a if w in common] == [w for w in b if w in common]
+
+def trigrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class Entry:
+    def __init__(self, question: str, grams: Counter, literals: tuple, value, expires: float):
+        self.question = question
+        self.grams = grams
+        self.literals = literals
+        self.value = value
+        self.expires = expires
+
+class SimilarityCache:
+    """LRU + TTL cache looked up by cosine similarity of TF-IDF trigram vectors."""
+
+    def __init__(self, name: str, maxsize: int = 2048, ttl: float = 3600, threshold: float = 0.85):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        # Trigram -> keys of the entries containing it, and its document frequency
+        self._postings = {}
+        self.lookups = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+
+    def _idf(self, gram: str) -> float:
+        return math.log((len(self._entries) + 1) / (len(self._postings.get(gram, ())) + 1)) + 1
+
+    def _cosine(self, a: Counter, b: Counter) -> float:
+        weights = {}
+        for gram in a.keys() | b.keys():
+            weights[gram] = self._idf(gram) ** 2
+        dot = sum(count * b[gram] * weights[gram] for gram, count in a.items() if gram in b)
+        norm_a = math.sqrt(sum(count * count * weights[gram] for gram, count in a.items()))
+        norm_b = math.sqrt(sum(count * count * weights[gram] for gram, count in b.items()))
+        return dot / (norm_a * norm_b) if norm_a and norm_b else 0.0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for gram in entry.grams:
+            postings = self._postings[gram]
+            postings.discard(key)
+            if not postings:
+                del self._postings[gram]
+
+    def get(self, question: str):
+        """The value stored for the most similar question above the threshold, or None."""
+        self.lookups += 1
+        key = normalize_question(question)
+        if not key:
+            return None
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires >= now:
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.value
+
+        grams = trigrams(key)
+        literals = tuple(LITERAL.findall(key))
+        words = key.split()
+        shared = Counter()
+        for gram in grams:
+            for candidate in self._postings.get(gram, ()):
+                shared[candidate] += 1
+
+        best, best_score = None, self.threshold
+        for candidate, _ in shared.most_common(MAX_CANDIDATES):
+            entry = self._entries[candidate]
+            if entry.expires < now or entry.literals != literals or not same_order(words, candidate.split()):
+                continue
+            score = self._cosine(grams, entry.grams)
+            if score >= best_score:
+                best, best_score = candidate, score
+        if best is None:
+            return None
+        self._entries.move_to_end(best)
+        self.near_hits += 1
+        return self._entries[best].value
+
+    def set(self, question: str, value):
+        key = normalize_question(question)
+        if not key:
+            return
+        if key in self._entries:
+            self._remove(key)
+        grams = trigrams(key)
+        self._entries[key] = Entry(question, grams, tuple(LITERAL.findall(key)), value, time.time() + self.ttl)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.near_hits
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "llm_calls_saved": hits,
+            "hit_rate": round(hits / self.lookups, 3) if self.lookups else 0.0,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,65 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+Concurrent callers with the same key share one upstream call and all receive
+its result (or its exception). Works in front of the result caches: the cache
+answers repeats after a call finishes, single-flight answers repeats that arrive
+while it is still running.
+"""
+import asyncio
+
+# All groups created through SingleFlight, used for stats reporting
+FLIGHTS = {}
+
+class SingleFlight:
+    """Deduplicates concurrent calls per key and counts the upstream calls saved."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}
+        self._waiters = {}
+        self.calls = 0
+        self.saved = 0
+        FLIGHTS[name] = self
+
+    async def do(self, key: str, factory):
+        """Await `factory()` once per key, sharing the result with concurrent callers."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.calls += 1
+        else:
+            self.saved += 1
+
+        self._waiters[key] += 1
+        try:
+            # Shielded so one caller going away does not cancel the call for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Cancel the upstream call once nobody is waiting for it any more
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not task.done():
+                    task.cancel()
+            raise
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+        # Mark the exception as retrieved when every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "upstream_calls": self.calls,
+            "calls_saved": self.saved,
+            "in_flight": len(self._inflight),
+        }
+
+def flight_stats() -> dict:
+    """Coalescing counters for every registered group."""
+    return {name: flight.stats() for name, flight in FLIGHTS.items()}
@@ -0,0 +1,164 @@
+"""
+Server-sent-events helpers for streaming LLM output to the frontend.
+The models answer in JSON ({"result": ...} or {"mermaid_syntax": ...}), so the
+value of that field is decoded incrementally and forwarded as it arrives.
+/calculate answers are a list of dicts, which is split into items as each one closes.
+"""
+import ast
+import json
+import re
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class JsonFieldExtractor:
+    """Incrementally decode the string value of one field from a streamed JSON object."""
+
+    def __init__(self, field: str):
+        # The /ask-ai prompt shows an unquoted key, so accept both forms
+        self._pattern = re.compile(r'"?%s"?\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._pos = None
+        self.value = ""
+        self.done = False
+
+    @property
+    def started(self) -> bool:
+        """Whether the field has been found in the output so far."""
+        return self._pos is not None
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of raw model output and return the newly decoded value text."""
+        if self.done:
+            return ""
+        self._buffer += chunk
+        if self._pos is None:
+            match = self._pattern.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        buf = self._buffer
+        i = self._pos
+        out = []
+        while i < len(buf):
+            char = buf[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char == '\\':
+                # Wait for the rest of an escape sequence split across chunks
+                if i + 1 >= len(buf):
+                    break
+                escape = buf[i + 1]
+                if escape == 'u':
+                    if i + 6 > len(buf):
+                        break
+                    code = int(buf[i + 2:i + 6], 16)
+                    if 0xD800 <= code < 0xDC00:
+                        # A high surrogate needs the low one after it; wait if it may still come
+                        follows = buf[i + 6:i + 8]
+                        if len(buf) < i + 12 and "\\u".startswith(follows):
+                            break
+                        low = int(buf[i + 8:i + 12], 16) if follows == "\\u" else 0
+                        if 0xDC00 <= low < 0xE000:
+                            out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                            i += 12
+                            continue
+                    # Lone surrogates cannot be encoded as UTF-8
+                    out.append("\ufffd" if 0xD800 <= code < 0xE000 else chr(code))
+                    i += 6
+                    continue
+                out.append(_ESCAPES.get(escape, escape))
+                i += 2
+                continue
+            out.append(char)
+            i += 1
+        self._pos = i
+
+        text = "".join(out)
+        self.value += text
+        return text
+
+def loads_answer(text: str):
+    """Parse model output as JSON, falling back to the Python literal syntax the /calculate prompt allows."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return ast.literal_eval(text)
+
+class JsonArrayItems:
+    """Incrementally split a streamed top-level array into its object items."""
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._quote = None
+        self._start = None
+        self.closed = False
+
+    def feed(self, chunk: str) -> list:
+        """Add a chunk of raw model output and return the objects completed by it."""
+        if self.closed:
+            return []
+        self._buffer += chunk
+        buf = self._buffer
+        items = []
+        i = self._pos
+        while i < len(buf):
+            char = buf[i]
+            if self._quote is not None:
+                if char == "\\":
+                    # Skip the escaped character, or wait for it if the chunk ends here
+                    if i + 1 >= len(buf):
+                        break
+                    i += 1
+                elif char == self._quote:
+                    self._quote = None
+            elif char in "\"'":
+                self._quote = char
+            elif char in "[{":
+                self._depth += 1
+                if char == "{" and self._depth == 2:
+                    self._start = i
+            elif char in "]}":
+                self._depth -= 1
+                if char == "}" and self._depth == 1 and self._start is not None:
+                    items.append(loads_answer(buf[self._start:i + 1]))
+                    self._start = None
+                elif self._depth == 0:
+                    self.closed = True
+                    i += 1
+                    break
+            i += 1
+
+        # Drop consumed text so the buffer only holds the item being written
+        keep = self._start if self._start is not None else i
+        self._buffer = buf[keep:]
+        self._pos = i - keep
+        if self._start is not None:
+            self._start = 0
+        return items
+
+def extract_field(text: str, field: str) -> str:
+    """Value of `field` in a complete JSON response, or the text unchanged if absent."""
+    extractor = JsonFieldExtractor(field)
+    extractor.feed(text)
+    return extractor.value if extractor.started else text
+
+def sse_event(data: dict, event: str | None = None) -> str:
+    """Format one server-sent event."""
+    message = ""
+    if event:
+        message += f"event: {event}\n"
+    message += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return message
+
+# Sent first so headers and the first byte go out before the model produces anything
+SSE_OPEN = ": stream-open\n\n"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
@@ -1,25 +1,42 @@
-import google.genai as genai
-from google.genai import types
-import ast
+import asyncio
 import json
+import hashlib
 from PIL import Image
 from dotenv import load_dotenv
 import os
 import base64
-from io import BytesIO
+from providers import gemini_generate, gemini_stream, run_blocking, registry
+from streaming import JsonArrayItems, loads_answer
+from preprocess import flatten, background_color, ink_mask, prepare_image
+from metrics import span, IMAGE_BYTES, PROMPT_SIZE, current_endpoint
 
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API")
 
-def analyze_image(img: Image, dict_of_vars: dict):
-    # Create a client instance
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    
-    # Convert PIL Image to bytes
-    img_byte_arr = BytesIO()
-    img.save(img_byte_arr, format='PNG')
-    img_byte_arr = img_byte_arr.getvalue()
-    
+# Low bits of each color channel dropped before hashing, to absorb re-encoding noise
+IMAGE_HASH_DROP_BITS = int(os.getenv("IMAGE_HASH_DROP_BITS", "4"))
+
+def image_fingerprint(img: Image, drop_bits: int = IMAGE_HASH_DROP_BITS) -> str:
+    """
+    Fingerprint of a canvas: a hash of its flattened pixels at full resolution,
+    cropped to the ink bounding box so the same drawing at another offset still
+    matches. Only the low bits of each channel are ignored; any changed stroke,
+    down to a single digit, gives a different fingerprint.
+    """
+    rgb = flatten(img)
+    bbox = ink_mask(rgb, background_color(rgb)).getbbox()
+    if bbox is None:
+        return hashlib.sha256(b"blank").hexdigest()
+
+    ink = rgb.crop(bbox)
+    if drop_bits:
+        mask = 0xFF ^ ((1 << drop_bits) - 1)
+        ink = ink.point(lambda v: v & mask)
+    digest = hashlib.sha256(repr(ink.size).encode())
+    digest.update(ink.tobytes())
+    return digest.hexdigest()
+
+def build_prompt(dict_of_vars: dict) -> str:
+    """Instructions for solving the expressions in one canvas image."""
     dict_of_vars_str = json.dumps(dict_of_vars, ensure_ascii=False)
     prompt = (
         f"You have been given an image with some mathematical expressions, equations, or graphical problems, and you need to solve them. "
@@ -42,7 +59,43 @@ def analyze_image(img: Image, dict_of_vars: dict):
         f"DO NOT USE BACKTICKS OR MARKDOWN FORMATTING. "
         f"PROPERLY QUOTE THE KEYS AND VALUES IN THE DICTIONARY FOR EASIER PARSING WITH Python's ast.literal_eval."
     )
+    return prompt
+
+def build_batch_prompt(dict_of_vars: dict, count: int) -> str:
+    """Instructions for solving several canvas regions sent in one request."""
+    return (
+        f"You have been given {count} images, labelled Image 1 to Image {count}, each a separate region of the same whiteboard. "
+        f"Apply the following instructions to EACH image independently. "
+        f"Return a LIST WITH EXACTLY {count} ELEMENTS in image order, where element i is the list of dicts for Image i "
+        f"(an empty list if that image has nothing to solve). "
+        + build_prompt(dict_of_vars)
+    )
 
+def normalize_answers(answers: list) -> list:
+    """Make sure every answer dict carries a boolean 'assign' key."""
+    for answer in answers:
+        if 'assign' in answer:
+            answer['assign'] = True
+        else:
+            answer['assign'] = False
+    return answers
+
+async def prepare_image_bytes(img: Image, raw: bytes | None = None) -> bytes:
+    """Crop, downscale and encode the canvas off the event loop."""
+    with span("encode"):
+        img_byte_arr, report = await run_blocking(prepare_image, img, raw)
+    if report["bytes_in"] is not None:
+        IMAGE_BYTES.observe(report["bytes_in"], "in")
+    IMAGE_BYTES.observe(report["bytes_out"], "out")
+    print(
+        f"Image preprocessed: {report['size_in']} {report['bytes_in']} -> {report['bytes_out']} bytes, "
+        f"encode {report['encode_seconds'] * 1000:.1f} ms, reencoded={report['reencoded']}"
+    )
+    return img_byte_arr
+
+def image_request(img_byte_arr: bytes, prompt: str) -> dict:
+    """Keyword arguments for a Gemini call on one canvas image."""
+    from google.genai import types
     # Create content with image and prompt
     contents = [
         types.Content(
@@ -61,28 +114,75 @@ def analyze_image(img: Image, dict_of_vars: dict):
     generate_content_config = types.GenerateContentConfig(
         response_mime_type="application/json"
     )
+    return dict(model="gemini-2.0-flash", contents=contents, config=generate_content_config)
+
+async def analyze_image(img: Image, dict_of_vars: dict, raw: bytes | None = None):
+    # Shared client from the provider registry
+    client = registry.gemini
+    
+    img_byte_arr = await prepare_image_bytes(img, raw)
+    with span("prompt_build"):
+        prompt = build_prompt(dict_of_vars)
+    PROMPT_SIZE.observe(len(prompt), current_endpoint.get())
 
     try:
         # Generate content using the new API
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=contents,
-            config=generate_content_config
-        )
+        with span("provider_call"):
+            response = await gemini_generate(client, **image_request(img_byte_arr, prompt))
         
         # Parse the response
-        answers = ast.literal_eval(response.text)
+        with span("parse"):
+            answers = loads_answer(response.text)
         
         # Process the answers
-        for answer in answers:
-            if 'assign' in answer:
-                answer['assign'] = True
-            else:
-                answer['assign'] = False
-                
-        return answers
+        return normalize_answers(answers)
         
     except Exception as e:
         print(f"Error in generating or parsing response from Gemini API: {e}")
         # Instead of returning empty list, raise the error to be handled by the endpoint
         raise e
+
+async def analyze_image_stream(img: Image, dict_of_vars: dict, raw: bytes | None = None):
+    """Like analyze_image, but yield each answer dict as soon as Gemini finishes writing it."""
+    img_byte_arr = await prepare_image_bytes(img, raw)
+    with span("prompt_build"):
+        prompt = build_prompt(dict_of_vars)
+    PROMPT_SIZE.observe(len(prompt), current_endpoint.get())
+
+    items = JsonArrayItems()
+    async for chunk in gemini_stream(registry.gemini, **image_request(img_byte_arr, prompt)):
+        for answer in items.feed(chunk):
+            yield normalize_answers([answer])[0]
+    if not items.closed:
+        raise ValueError("Incomplete answer list from Gemini")
+
+async def analyze_images(images: list, dict_of_vars: dict) -> list:
+    """
+    Solve several canvas regions with a single multi-image Gemini request.
+    `images` is a list of (PIL image, raw bytes) pairs; returns one answer list per image.
+    """
+    from google.genai import types
+    client = registry.gemini
+
+    encoded = await asyncio.gather(*(prepare_image_bytes(img, raw) for img, raw in images))
+    parts = []
+    for index, img_byte_arr in enumerate(encoded, start=1):
+        parts.append(types.Part.from_text(text=f"Image {index}:"))
+        parts.append(types.Part.from_bytes(mime_type="image/png", data=img_byte_arr))
+    parts.append(types.Part.from_text(text=build_batch_prompt(dict_of_vars, len(images))))
+
+    try:
+        response = await gemini_generate(
+            client,
+            model="gemini-2.0-flash",
+            contents=[types.Content(role="user", parts=parts)],
+            config=types.GenerateContentConfig(response_mime_type="application/json")
+        )
+        results = loads_answer(response.text)
+        if not isinstance(results, list) or len(results) != len(images):
+            raise ValueError(f"Expected {len(images)} answer lists, got {len(results) if isinstance(results, list) else type(results).__name__}")
+        return [normalize_answers(answers) for answers in results]
+
+    except Exception as e:
+        print(f"Error in packed multi-image request to Gemini API: {e}")
+        raise e
@@ -0,0 +1,22 @@
+"""
+The app with the fake providers installed, for benchmarks that run it under a
+real server (uvicorn workers each import this module and get their own fakes).
+
+    PYTHONPATH=app:bench uvicorn fake_app:app --workers 4
+
+BENCH_LATENCY sets the fake provider latency (see fakes.Latency).
+"""
+import os
+
+os.environ.setdefault("GROQ_API", "bench")
+os.environ.setdefault("GEMINI_API", "bench")
+os.environ.setdefault("PROVIDER_WARMUP", "0")
+
+import main
+from fakes import FakeProvider, Latency, install
+
+LATENCY = os.getenv("BENCH_LATENCY", "lognormal:0.3:0.4")
+
+install(FakeProvider(Latency(LATENCY)), FakeProvider(Latency(LATENCY)))
+
+app = main.app
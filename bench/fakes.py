@@ -0,0 +1,201 @@
+"""
+In-process stand-ins for the Gemini and Groq clients used by the benchmarks.
+
+Each fake sleeps for a latency drawn from a configurable distribution, fails
+with a configurable probability using the error text the real SDKs produce,
+and returns payloads the endpoints accept: Mermaid JSON for diagrams, an
+`ast.literal_eval`-able answer list for /calculate and {"result": ...} for /ask-ai.
+Nothing here touches the network, so the benchmarks run fully offline.
+"""
+import asyncio
+import base64
+import json
+import random
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+from PIL import Image
+
+from circuit import BREAKERS
+from providers import registry
+
+MERMAID_TEXT = '{"mermaid_syntax": "graph TD; A[Start] --> B{Check}; B -->|yes| C[Done]; B -->|no| A"}'
+CALCULATE_TEXT = "[{'expr': '2 + 2', 'result': '4', 'steps': 'Add the two numbers'}]"
+ANSWER = {"result": "4"}
+VISION_TEXT = '{"expression": "2 + 2", "result": "4"}'
+
+GEMINI_ERROR = "503 UNAVAILABLE. {'error': {'code': 503, 'message': 'The model is overloaded.'}}"
+GROQ_ERROR = "Error code: 500 - {'error': {'message': 'Internal server error'}}"
+
+
+class Latency:
+    """
+    Latency distribution parsed from a spec string:
+    "fixed:0.5", "uniform:0.2:0.8" or "lognormal:<median>:<sigma>".
+    """
+
+    def __init__(self, spec: str = "lognormal:0.5:0.4", seed: int | None = None):
+        kind, *args = spec.split(":")
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(a) for a in args]
+        self.random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return self.random.uniform(*self.args)
+        median, sigma = self.args
+        return median * self.random.lognormvariate(0, sigma)
+
+
+class FakeProvider:
+    """Latency and failure behaviour shared by the fakes of one provider."""
+
+    def __init__(self, latency: Latency, error_rate: float = 0.0, error_text: str = GEMINI_ERROR,
+                 chunks: int = 8):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_text = error_text
+        self.chunks = chunks
+        self.calls = 0
+        self.errors = 0
+
+    async def respond(self):
+        """Wait one sampled latency, then raise or return normally."""
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        if self.latency.random.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError(self.error_text)
+
+    def respond_blocking(self):
+        """Synchronous variant for SDK clients the app calls on its thread pool."""
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if self.latency.random.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError(self.error_text)
+
+    async def stream(self, text: str):
+        """Yield `text` in pieces spread over one sampled latency."""
+        self.calls += 1
+        total = self.latency.sample()
+        size = max(1, len(text) // self.chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        fail_at = len(pieces) // 2 if self.latency.random.random() < self.error_rate else None
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(total / len(pieces))
+            if index == fail_at:
+                self.errors += 1
+                raise RuntimeError(self.error_text)
+            yield piece
+
+
+def _usage(contents) -> SimpleNamespace:
+    # Rough token counts so the limiter settle and token metrics paths run
+    prompt = sum(len(str(c)) for c in contents) // 4
+    return SimpleNamespace(prompt_token_count=prompt, candidates_token_count=64,
+                           total_token_count=prompt + 64)
+
+
+class FakeModels:
+    def __init__(self, provider: FakeProvider):
+        self.provider = provider
+
+    def _text(self, contents) -> str:
+        # Diagram requests carry a system turn, image analysis a single user turn
+        if len(contents) > 1:
+            return MERMAID_TEXT
+        # Packed multi-image requests expect one answer list per image
+        images = sum(1 for part in contents[0].parts if part.inline_data is not None)
+        # A text-only request is an /ask-ai question routed to Gemini
+        if images == 0:
+            return json.dumps(ANSWER)
+        if images > 1:
+            return "[" + ", ".join([CALCULATE_TEXT] * images) + "]"
+        return CALCULATE_TEXT
+
+    async def generate_content(self, model, contents, config=None):
+        await self.provider.respond()
+        return SimpleNamespace(text=self._text(contents), usage_metadata=_usage(contents))
+
+    async def generate_content_stream(self, model, contents, config=None):
+        async def chunks():
+            async for piece in self.provider.stream(self._text(contents)):
+                yield SimpleNamespace(text=piece)
+        return chunks()
+
+    async def get(self, model):
+        await self.provider.respond()
+
+
+class FakeGemini:
+    """Replaces `genai.Client`; only the `aio.models` surface the app uses."""
+
+    def __init__(self, provider: FakeProvider):
+        self.aio = SimpleNamespace(models=FakeModels(provider))
+
+
+class FakeRunnable:
+    """Replaces a langchain chain: `ainvoke` returns parsed JSON, `astream` yields message chunks."""
+
+    def __init__(self, provider: FakeProvider, response: dict):
+        self.provider = provider
+        self.response = response
+
+    async def ainvoke(self, value):
+        await self.provider.respond()
+        return self.response
+
+    async def astream(self, value):
+        async for piece in self.provider.stream(json.dumps(self.response)):
+            yield SimpleNamespace(content=piece)
+
+
+class FakeGroqVision:
+    """Replaces the synchronous Groq client used for the /calculate vision fallback."""
+
+    def __init__(self, provider: FakeProvider):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.provider = provider
+
+    def create(self, **kwargs):
+        self.provider.respond_blocking()
+        message = SimpleNamespace(content=VISION_TEXT)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def install(gemini: FakeProvider, groq: FakeProvider) -> dict:
+    """Swap the registry's clients and chains for fakes; returns them keyed by provider."""
+    registry._gemini = FakeGemini(gemini)
+    diagram = {"mermaid_syntax": json.loads(MERMAID_TEXT)["mermaid_syntax"]}
+    registry._objects["diagram_llm"] = FakeRunnable(groq, diagram)
+    registry._objects["diagram_streaming_llm"] = FakeRunnable(groq, diagram)
+    registry._objects["ask_ai_chain"] = FakeRunnable(groq, ANSWER)
+    registry._objects["ask_ai_streaming_chain"] = FakeRunnable(groq, ANSWER)
+    registry._objects["groq_vision"] = FakeGroqVision(groq)
+    # Recovery probes would otherwise go to the real Groq API
+    BREAKERS["gemini"].probe = gemini.respond
+    BREAKERS["groq"].probe = groq.respond
+    return {"gemini": gemini, "groq": groq}
+
+
+def canvas_data_url(i):
+    # A different shape per request so neither the cache nor single-flight merges them:
+    # the bits of i as filled cells between two fixed bars (the fingerprint ignores offsets)
+    white = (255, 255, 255, 255)
+    image = Image.new("RGBA", (400, 300), (0, 0, 0, 0))
+    image.paste(white, (10, 10, 20, 200))
+    image.paste(white, (370, 10, 380, 200))
+    for bit in range(16):
+        if i >> bit & 1:
+            x, y = 30 + (bit % 8) * 42, 15 + (bit // 8) * 95
+            image.paste(white, (x, y, x + 30, y + 80))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
@@ -0,0 +1,142 @@
+"""
+Offline load and latency benchmark for /generate-mermaid, /calculate and /ask-ai.
+
+Runs the ASGI app in-process with the fake providers from bench/fakes.py, drives
+each endpoint with a fixed number of concurrent clients and reports throughput,
+latency percentiles and CPU time per request. Results can be saved as JSON and
+compared against a previous run to catch regressions.
+
+Usage:
+    python bench/load.py --requests 500 --concurrency 50 --latency lognormal:0.3:0.5
+    python bench/load.py --save baseline.json
+    python bench/load.py --compare baseline.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+os.environ.setdefault("GROQ_API", "bench")
+os.environ.setdefault("GEMINI_API", "bench")
+
+import httpx
+
+import main
+from fakes import FakeProvider, Latency, install, canvas_data_url, GEMINI_ERROR, GROQ_ERROR
+
+ENDPOINTS = {
+    "mermaid": ("/generate-mermaid", lambda i: {"prompt": f"make a flowchart of step {i}"}),
+    # Distinct canvases and no variables, so every request is a provider call rather than
+    # a cache hit, a coalesced duplicate or a local recompute
+    "calculate": ("/calculate", lambda i: {"image": canvas_data_url(i), "dict_of_vars": {}}),
+    "ask-ai": ("/ask-ai", lambda i: {"question": f"explain topic number {i}"}),
+}
+
+
+def percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def drive(client, url: str, make_payload, requests: int, concurrency: int) -> dict:
+    """Closed-loop load: `concurrency` clients each send their next request as soon as one returns."""
+    payloads = [make_payload(i) for i in range(requests)]
+    latencies = []
+    statuses = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            payload = payloads[next_index]
+            next_index += 1
+            start = time.perf_counter()
+            response = await client.post(url, json=payload)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "rps": round(requests / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "cpu_ms_per_request": round(cpu / requests * 1000, 2),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of more than `tolerance` (a fraction) against a saved run."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "cpu_ms_per_request"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {previous[metric]} -> {current[metric]}")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name} rps: {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+async def run_bench(args) -> dict:
+    fakes = install(
+        FakeProvider(Latency(args.latency, args.seed), args.gemini_error_rate, GEMINI_ERROR),
+        FakeProvider(Latency(args.latency, args.seed), args.groq_error_rate, GROQ_ERROR),
+    )
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name in args.endpoints:
+            url, make_payload = ENDPOINTS[name]
+            results[name] = await drive(client, url, make_payload, args.requests, args.concurrency)
+            row = results[name]
+            print(f"{url:20s} {row['rps']:8.1f} rps  p50 {row['p50_ms']:8.1f} ms  "
+                  f"p95 {row['p95_ms']:8.1f} ms  p99 {row['p99_ms']:8.1f} ms  "
+                  f"cpu {row['cpu_ms_per_request']:6.2f} ms/req  statuses={row['statuses']}")
+    for provider, fake in fakes.items():
+        print(f"fake {provider}: {fake.calls} calls, {fake.errors} injected errors")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", default="lognormal:0.3:0.4",
+                        help="fake provider latency: fixed:S, uniform:A:B or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--groq-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(run_bench(args))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
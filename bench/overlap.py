@@ -0,0 +1,51 @@
+"""
+Load test showing that concurrent requests overlap on a single worker.
+
+Replaces the Gemini and Groq clients with fakes that sleep for a fixed latency,
+fires N concurrent requests at each endpoint through the ASGI app and reports the
+wall time. With a non-blocking provider layer the wall time is close to one
+provider latency; with blocking calls it is close to N times that.
+
+Usage: python bench/overlap.py [concurrency] [latency_seconds]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+os.environ.setdefault("GROQ_API", "bench")
+os.environ.setdefault("GEMINI_API", "bench")
+
+import httpx
+
+import main
+from fakes import FakeProvider, Latency, install, canvas_data_url
+
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+
+async def fire(client, method, url, make_payload):
+    start = time.perf_counter()
+    tasks = [client.request(method, url, json=make_payload(i)) for i in range(CONCURRENCY)]
+    responses = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    statuses = {r.status_code for r in responses}
+    serial = CONCURRENCY * LATENCY
+    print(f"{url:20s} {CONCURRENCY} requests in {elapsed:.2f}s "
+          f"(serial would be {serial:.2f}s, statuses={sorted(statuses)})")
+
+
+async def run_bench():
+    install(FakeProvider(Latency(f"fixed:{LATENCY}")), FakeProvider(Latency(f"fixed:{LATENCY}")))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await fire(client, "POST", "/generate-mermaid", lambda i: {"prompt": f"make a flowchart of step {i}"})
+        await fire(client, "POST", "/calculate", lambda i: {"image": canvas_data_url(i), "dict_of_vars": {}})
+        await fire(client, "POST", "/ask-ai", lambda i: {"question": f"explain topic number {i}"})
+
+
+if __name__ == "__main__":
+    asyncio.run(run_bench())
@@ -0,0 +1,57 @@
+"""
+Regression check for the near-duplicate /ask-ai question cache.
+
+Stores the first question of each pair in a fresh SimilarityCache and looks up
+the second. Rephrasings must reuse the stored answer; questions that differ in
+an operator, a number, a negation or the order of their words must not.
+Exits non-zero when any pair behaves otherwise.
+
+Usage: python bench/similarity_check.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from similarity import SimilarityCache, normalize_question
+
+# Pairs that should share an answer
+SAME = [
+    ("make a checklist for react hooks", "create checklist react hooks"),
+    ("explain react hooks", "what are react hooks?"),
+    ("what is the difference between tcp and udp", "difference between tcp and udp please"),
+    ("how does c++ move semantics work", "how does c++ move semantic work"),
+]
+
+# Pairs that need different answers
+DIFFERENT = [
+    ("solve x^2 - 4 = 0", "solve x^2 + 4 = 0"),
+    ("17 * 23 in binary", "17 - 23 in binary"),
+    ("17*23", "17*24"),
+    ("convert fahrenheit to celsius", "convert celsius to fahrenheit"),
+    ("convert 5 km to miles", "convert 5 miles to km"),
+    ("is 91 a prime number", "is 91 not a prime number"),
+    ("why isn't python compiled", "why is python compiled"),
+    ("react hooks", "vue hooks"),
+]
+
+
+def check() -> list[str]:
+    failures = []
+    for pairs, expect_hit in ((SAME, True), (DIFFERENT, False)):
+        for stored, asked in pairs:
+            cache = SimilarityCache("check")
+            cache.set(stored, stored)
+            hit = cache.get(asked) is not None
+            print(f"{'hit ' if hit else 'miss'}  {stored!r} -> {asked!r}  "
+                  f"[{normalize_question(stored)} | {normalize_question(asked)}]")
+            if hit != expect_hit:
+                failures.append(f"{'expected a hit' if expect_hit else 'unexpected hit'}: {stored!r} -> {asked!r}")
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check()
+    for line in failures:
+        print(f"FAIL {line}")
+    sys.exit(1 if failures else 0)
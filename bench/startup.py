@@ -0,0 +1,113 @@
+"""
+Cold start benchmark.
+
+Reports how long `import main` takes, broken down by the modules it imports
+(from `python -X importtime`), and how long a fresh `uvicorn main:app` process
+takes to answer its first request. Each measurement is the median of several
+runs in new processes. Save a run and compare against it after a change:
+
+Usage:
+    python bench/startup.py --save before.json
+    python bench/startup.py --compare before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+ENV = {**os.environ, "PYTHONPATH": APP_DIR, "PROVIDER_WARMUP": "0",
+       "GROQ_API": os.getenv("GROQ_API", "bench"), "GEMINI_API": os.getenv("GEMINI_API", "bench")}
+
+
+def import_times() -> dict:
+    """Cumulative import time in ms of `main` and of every module `main` imports directly."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=APP_DIR, env=ENV, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        # Modules are listed after their imports: the depth 1 lines since the last
+        # top-level module are the direct imports of the next top-level one
+        if depth == 0 and name.strip() != "main":
+            times = {}
+        elif depth <= 1:
+            times[name.strip()] = times.get(name.strip(), 0) + int(cumulative) / 1000
+    return times
+
+
+def first_response_seconds(port: int) -> float:
+    """Seconds from spawning uvicorn until /health answers."""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=APP_DIR, env=ENV, stdout=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before answering")
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def measure(runs: int, port: int, top: int) -> dict:
+    samples = [import_times() for _ in range(runs)]
+    modules = {name: round(statistics.median(s.get(name, 0) for s in samples), 1) for name in samples[0]}
+    total = modules.pop("main", 0)
+    first_response = statistics.median(first_response_seconds(port) for _ in range(runs))
+    slowest = dict(sorted(modules.items(), key=lambda item: -item[1])[:top])
+    return {"import_main_ms": total, "first_response_ms": round(first_response * 1000, 1), "modules_ms": slowest}
+
+
+def print_report(result: dict, baseline: dict | None):
+    def line(label, value, previous):
+        change = f"  (was {previous:8.1f})" if previous is not None else ""
+        print(f"{label:32s} {value:8.1f} ms{change}")
+
+    baseline = baseline or {}
+    line("import main", result["import_main_ms"], baseline.get("import_main_ms"))
+    line("uvicorn to first response", result["first_response_ms"], baseline.get("first_response_ms"))
+    print("slowest direct imports of main:")
+    for name, ms in result["modules_ms"].items():
+        line(f"  {name}", ms, baseline.get("modules_ms", {}).get(name))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from an earlier --save to compare against")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = measure(args.runs, args.port, args.top)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,99 @@
+"""
+Throughput against the number of uvicorn worker processes.
+
+For each worker count, starts `uvicorn fake_app:app --workers N` on a fresh
+shared cache database, drives each endpoint over HTTP with unique requests
+(cold: every request goes to the fake providers) and then repeats the same
+requests (warm: answered from the cache). Warm requests mostly land on a
+different worker than the one that computed the result, so the warm numbers
+show the shared SQLite tier at work.
+
+Usage:
+    python bench/workers.py --workers 1 2 4 --requests 400 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from load import ENDPOINTS, drive
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "app")
+
+
+def start_server(workers: int, port: int, db_path: str, latency: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([APP_DIR, BENCH_DIR]),
+        "CACHE_DB_PATH": db_path,
+        "WEB_CONCURRENCY": str(workers),
+        "BENCH_LATENCY": latency,
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fake_app:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BENCH_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+
+
+async def wait_ready(client, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def bench_workers(workers: int, args) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(workers, args.port, os.path.join(tmp, "cache.db"), args.latency)
+        try:
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits) as client:
+                await wait_ready(client)
+                for name in args.endpoints:
+                    url, make_payload = ENDPOINTS[name]
+                    for phase in ("cold", "warm"):
+                        row = await drive(client, url, make_payload, args.requests, args.concurrency)
+                        results[f"{name}:{phase}"] = row
+                        print(f"workers={workers}  {url:20s} {phase}  {row['rps']:8.1f} rps  "
+                              f"p50 {row['p50_ms']:8.1f} ms  p99 {row['p99_ms']:8.1f} ms  statuses={row['statuses']}")
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", default="lognormal:0.3:0.4",
+                        help="fake provider latency: fixed:S, uniform:A:B or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--port", type=int, default=8765)
+    return parser.parse_args()
+
+
+async def main(args):
+    summary = {workers: await bench_workers(workers, args) for workers in args.workers}
+    print()
+    print("rps by worker count")
+    for key in summary[args.workers[0]]:
+        print(f"{key:20s} " + "  ".join(f"{workers}: {summary[workers][key]['rps']:8.1f}" for workers in args.workers))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,6 @@
+"""The app modules import each other by bare name, as they do when uvicorn runs from app/."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+os.environ.setdefault("PROVIDER_WARMUP", "0")
@@ -0,0 +1,112 @@
+import asyncio
+
+from PIL import Image, ImageDraw
+
+import main
+from canvas_diff import BoardState, Frame, TILE_SIZE, plan
+
+WIDTH, HEIGHT = 640, 160
+
+def canvas(*strokes):
+    """A white canvas with a black box per (column, width) stroke, spaced by whole tiles."""
+    img = Image.new("RGB", (WIDTH, HEIGHT), "white")
+    draw = ImageDraw.Draw(img)
+    for column, width in strokes:
+        left = column * TILE_SIZE
+        draw.rectangle((left, 2 * TILE_SIZE, left + width, 3 * TILE_SIZE), fill="black")
+    return img
+
+def answer(expr, result, assign=False, steps=""):
+    return {"expr": expr, "result": result, "assign": assign, "steps": steps}
+
+def test_first_frame_is_analyzed_in_full():
+    frame = Frame(canvas((1, 20), (8, 20)))
+    reused, pending = plan(frame, None, {})
+    assert reused == {}
+    assert pending == frame.regions
+    assert len(pending) == 2
+
+def test_unchanged_regions_are_reused():
+    before = Frame(canvas((1, 20), (8, 20)))
+    after = Frame(canvas((1, 20), (8, 50)))
+    left, right = before.regions
+    previous = BoardState(before, {left: [answer("1 + 1", 2)], right: [answer("2 + 2", 4)]}, {})
+    reused, pending = plan(after, previous, {})
+    assert reused == {left: [answer("1 + 1", 2)]}
+    assert pending == [after.regions[1]]
+
+def test_new_variables_reanalyze_everything():
+    frame = Frame(canvas((1, 20), (8, 20)))
+    left, right = frame.regions
+    previous = BoardState(frame, {left: [answer("1 + 1", 2)], right: [answer("2 + 2", 4)]}, {})
+    reused, pending = plan(frame, previous, {"x": 1})
+    assert reused == {}
+    assert pending == frame.regions
+
+def test_readers_of_a_changed_assignment_are_reanalyzed():
+    before = Frame(canvas((1, 20), (8, 20), (14, 20)))
+    after = Frame(canvas((1, 50), (8, 20), (14, 20)))
+    assign, reader, other = before.regions
+    previous = BoardState(before, {
+        assign: [answer("x", 4, assign=True, steps="x = 4")],
+        reader: [answer("x + 1", 5)],
+        other: [answer("2 * 3", 6)],
+    }, {})
+    reused, pending = plan(after, previous, {})
+    assert list(reused) == [other]
+    assert len(pending) == 2
+
+def test_chained_readers_are_reanalyzed():
+    before = Frame(canvas((1, 20), (8, 20), (14, 20)))
+    after = Frame(canvas((1, 50), (8, 20), (14, 20)))
+    first, second, third = before.regions
+    previous = BoardState(before, {
+        first: [answer("x", 4, assign=True, steps="x = 4")],
+        second: [answer("y", 8, assign=True, steps="y = x * 2")],
+        third: [answer("y + 10", 18)],
+    }, {})
+    reused, pending = plan(after, previous, {})
+    assert reused == {}
+    assert len(pending) == 3
+
+# Expressions per region for the fake solver; assignments are "name = expression"
+EXPRESSIONS = {}
+
+async def fake_solve_canvas(region, image_data, dict_of_vars, bypass_cache=False):
+    text = EXPRESSIONS[region]
+    numbers = {k: v for k, v in dict_of_vars.items() if isinstance(v, (int, float))}
+    name, _, expr = text.rpartition("=")
+    try:
+        value = eval(expr, {}, numbers)
+    except NameError:
+        value = expr.strip()
+    if name:
+        return [answer(name.strip(), value, assign=True, steps=text)]
+    return [answer(text, value)]
+
+def solve_dependent(monkeypatch, expressions, answers, pending):
+    EXPRESSIONS.clear()
+    EXPRESSIONS.update(expressions)
+    monkeypatch.setattr(main, "solve_canvas", fake_solve_canvas)
+    return asyncio.run(main.solve_dependent_regions(answers, pending, lambda region: region, {}))
+
+def test_reader_solved_alongside_an_assignment_gets_its_value(monkeypatch):
+    answers = {"a": [answer("x", 5, assign=True, steps="x = 5")], "b": [answer("x + 1", "x + 1")]}
+    assert solve_dependent(monkeypatch, {"a": "x = 5", "b": "x + 1"}, answers, ["a", "b"])
+    assert answers["b"] == [answer("x + 1", 6)]
+
+def test_reused_reader_of_a_new_assignment_is_resolved(monkeypatch):
+    answers = {"a": [answer("x", 7, assign=True, steps="x = 7")], "b": [answer("x * 3", 12)]}
+    assert solve_dependent(monkeypatch, {"a": "x = 7", "b": "x * 3"}, answers, ["a"])
+    assert answers["b"] == [answer("x * 3", 21)]
+
+def test_independent_regions_are_not_resolved(monkeypatch):
+    answers = {"a": [answer("1 + 1", 2)], "b": [answer("2 + 2", 4)]}
+    assert solve_dependent(monkeypatch, {}, answers, ["a", "b"])
+
+def test_circular_assignments_do_not_settle(monkeypatch):
+    answers = {
+        "a": [answer("x", 0, assign=True, steps="x = y + 1")],
+        "b": [answer("y", 0, assign=True, steps="y = x + 1")],
+    }
+    assert not solve_dependent(monkeypatch, {"a": "x = y + 1", "b": "y = x + 1"}, answers, ["a", "b"])
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+import providers
+from circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, classify_error
+from ratelimit import LIMITERS, ProviderLimiter, RateLimited, TokenBucket
+
+class StatusError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+def breaker(**kwargs):
+    kwargs.setdefault("min_failures", 3)
+    kwargs.setdefault("window", 6)
+    return CircuitBreaker("test", **kwargs)
+
+def trip(breaker, failures=3):
+    for _ in range(failures):
+        breaker.before_call()
+        breaker.record_failure(ValueError("upstream error"), 0.1)
+
+def expire(breaker):
+    breaker.open_until -= breaker.open_seconds
+
+def test_opens_once_enough_recent_calls_fail():
+    b = breaker()
+    for _ in range(3):
+        b.record_success(0.1)
+    trip(b, 2)
+    assert b.state == CLOSED
+    trip(b, 1)
+    assert b.state == OPEN
+    with pytest.raises(CircuitOpen) as error:
+        b.before_call()
+    assert error.value.status_code == 503
+    assert b.short_circuited == 1
+
+def test_slow_calls_count_as_failures():
+    b = breaker(slow_call_seconds=1)
+    for _ in range(3):
+        b.record_success(5.0)
+    assert b.state == OPEN
+    assert b.errors == {"slow": 3}
+
+def test_auth_errors_open_immediately_for_longer():
+    b = breaker(open_seconds=30, auth_open_seconds=300)
+    b.record_failure(StatusError("forbidden", 403), 0.1)
+    assert b.state == OPEN
+    assert b.open_until - b.opened_at == 300
+
+def test_half_open_admits_a_single_trial_call():
+    b = breaker()
+    trip(b)
+    expire(b)
+    assert b.before_call() is True
+    assert b.state == HALF_OPEN
+    for _ in range(3):
+        with pytest.raises(CircuitOpen):
+            b.before_call()
+    b.record_success(0.1)
+    assert b.state == CLOSED
+    assert b.before_call() is False
+
+def test_failed_trial_reopens():
+    b = breaker()
+    trip(b)
+    expire(b)
+    b.before_call()
+    b.record_failure(ValueError("still down"), 0.1)
+    assert b.state == OPEN
+    with pytest.raises(CircuitOpen):
+        b.before_call()
+
+def test_abandoned_trial_lets_the_next_call_try():
+    b = breaker()
+    trip(b)
+    expire(b)
+    assert b.before_call() is True
+    b.end_trial()
+    assert b.before_call() is True
+
+def test_probe_half_opens_only_once_the_provider_answers():
+    attempts = []
+
+    async def probe():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ValueError("still down")
+
+    async def main():
+        b = breaker(open_seconds=0.01)
+        b.probe = probe
+        trip(b)
+        assert b.state == OPEN
+        for _ in range(100):
+            if b.state != OPEN:
+                break
+            with pytest.raises(CircuitOpen):
+                b.before_call()
+            await asyncio.sleep(0.01)
+        assert b.state == HALF_OPEN
+        assert len(attempts) == 3
+        b.close()
+
+    asyncio.run(main())
+
+@pytest.mark.parametrize("exc, error_class", [
+    (StatusError("unauthorized", 401), "auth"),
+    (ValueError("API key expired. Please renew the API key."), "auth"),
+    (asyncio.TimeoutError(), "timeout"),
+    (ConnectionError("Connection refused"), "network"),
+    (StatusError("internal error", 500), "upstream"),
+    (ValueError("Your API key was mentioned in the prompt"), "upstream"),
+])
+def test_classify_error(exc, error_class):
+    assert classify_error(exc) == error_class
+
+@pytest.fixture
+def half_open(monkeypatch):
+    b = breaker()
+    trip(b)
+    expire(b)
+    monkeypatch.setitem(providers.BREAKERS, "gemini", b)
+    return b
+
+def test_cancelled_trial_call_frees_the_trial(half_open):
+    async def main():
+        call = asyncio.ensure_future(providers.call_provider("gemini", "hi", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        with pytest.raises(CircuitOpen):
+            half_open.before_call()
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+    asyncio.run(main())
+    assert half_open.before_call() is True
+
+def test_rate_limited_trial_call_frees_the_trial(half_open, monkeypatch):
+    limiter = ProviderLimiter("gemini", max_queue=0)
+    limiter.requests = TokenBucket(1)
+    limiter.requests.level = 0
+    monkeypatch.setitem(LIMITERS, "gemini", limiter)
+
+    async def never_called():
+        raise AssertionError("the provider must not be called")
+
+    with pytest.raises(RateLimited):
+        asyncio.run(providers.call_provider("gemini", "hi", never_called))
+    assert half_open.before_call() is True
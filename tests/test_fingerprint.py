@@ -0,0 +1,37 @@
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+from utils import image_fingerprint
+
+LINES = ["a = 12", "99 / 3", "a * 7 + 45"]
+
+def board(lines=LINES, dx=0, dy=0):
+    """A transparent canvas with white handwriting-sized text, as the frontend sends it."""
+    font = ImageFont.load_default(size=40)
+    img = Image.new("RGBA", (1200, 700), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((100 + dx, 100 + dy + i * 150), line, fill=(255, 255, 255, 255), font=font)
+    return img
+
+def test_same_drawing_at_another_offset_matches():
+    assert image_fingerprint(board(dx=37, dy=21)) == image_fingerprint(board())
+
+def test_low_bit_noise_is_ignored():
+    img = board().convert("RGB")
+    noisy = ImageChops.add(img, Image.new("RGB", img.size, (3, 3, 3)))
+    assert image_fingerprint(noisy) == image_fingerprint(img)
+
+@pytest.mark.parametrize("line, column", [(0, 4), (0, 5), (1, 0), (1, 5), (2, 4), (2, 8), (2, 9)])
+def test_every_changed_digit_changes_the_fingerprint(line, column):
+    base = image_fingerprint(board())
+    for digit in "0123456789":
+        if digit == LINES[line][column]:
+            continue
+        lines = list(LINES)
+        lines[line] = lines[line][:column] + digit + lines[line][column + 1:]
+        assert image_fingerprint(board(lines)) != base, lines
+
+def test_blank_canvases_share_a_fingerprint():
+    assert image_fingerprint(Image.new("RGBA", (800, 600), (0, 0, 0, 0))) == \
+        image_fingerprint(Image.new("RGB", (400, 300), "white"))
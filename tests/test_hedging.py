@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from hedging import Hedger
+
+def answer(value, delay=0.0):
+    async def call():
+        await asyncio.sleep(delay)
+        return value
+    return call
+
+def fail(message, delay=0.0):
+    async def call():
+        await asyncio.sleep(delay)
+        raise ValueError(message)
+    return call
+
+def watched(value, delay, log):
+    """An answer that records in `log` whether it was cancelled or finished."""
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append("cancelled")
+            raise
+        log.append("finished")
+        return value
+    return call
+
+def run(hedger, primary, fallback, mode=None):
+    return asyncio.run(hedger.run("primary", primary, "fallback", fallback, mode=mode))
+
+def test_sequential_uses_the_fallback_only_after_a_failure():
+    hedger = Hedger("test")
+    log = []
+    assert run(hedger, answer("p"), watched("f", 0, log)) == "p"
+    assert log == []
+    assert run(hedger, fail("down"), answer("f")) == "f"
+    assert hedger.wins == {"primary": 1, "fallback": 1}
+    assert hedger.failures == {"primary": 1}
+
+def test_both_failing_raises_the_fallback_error():
+    for mode in ("sequential", "hedge", "race"):
+        hedger = Hedger("test", delay="0.01")
+        with pytest.raises(ValueError, match="fallback down"):
+            run(hedger, fail("primary down"), fail("fallback down"), mode=mode)
+
+def test_hedge_fires_the_fallback_after_the_delay_and_cancels_the_loser():
+    hedger = Hedger("test", mode="hedge", delay="0.05")
+    log = []
+    assert run(hedger, watched("p", 1.0, log), answer("f")) == "f"
+    assert hedger.hedges_fired == 1
+    assert hedger.cancelled == 1
+    assert log == ["cancelled"]
+
+def test_hedge_does_not_fire_for_a_fast_primary():
+    hedger = Hedger("test", mode="hedge", delay="0.5")
+    log = []
+    assert run(hedger, answer("p"), watched("f", 0, log)) == "p"
+    assert hedger.hedges_fired == 0
+    assert log == []
+
+def test_hedge_starts_the_fallback_at_once_when_the_primary_fails_early():
+    hedger = Hedger("test", mode="hedge", delay="10")
+    assert asyncio.run(asyncio.wait_for(
+        hedger.run("primary", fail("down"), "fallback", answer("f")), timeout=1
+    )) == "f"
+
+def test_race_returns_the_fastest():
+    hedger = Hedger("test", mode="race")
+    log = []
+    assert run(hedger, watched("p", 1.0, log), answer("f", 0.01)) == "f"
+    assert log == ["cancelled"]
+
+def test_race_ignores_a_fast_failure():
+    hedger = Hedger("test", mode="race")
+    assert run(hedger, fail("down"), answer("f", 0.05)) == "f"
+
+def test_auto_delay_follows_the_primary_latency_quantile():
+    hedger = Hedger("test", default_delay=2.0, quantile=0.9)
+    assert hedger.hedge_delay() == 2.0
+    hedger.latencies.extend(i / 100 for i in range(1, 101))
+    assert hedger.hedge_delay() == pytest.approx(0.91)
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        Hedger("test", mode="fastest")
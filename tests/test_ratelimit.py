@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from ratelimit import ProviderLimiter, RateLimited, TokenBucket
+
+def limiter(per_second=0.0, tokens_per_second=0.0, burst_seconds=1.0, **kwargs):
+    """A limiter with buckets sized for fast tests."""
+    limiter = ProviderLimiter("test", **kwargs)
+    if per_second:
+        limiter.requests = TokenBucket(per_second * 60, burst_seconds=burst_seconds)
+    if tokens_per_second:
+        limiter.tokens = TokenBucket(tokens_per_second * 60, burst_seconds=burst_seconds)
+    return limiter
+
+def test_disabled_limiter_admits_everything():
+    unlimited = ProviderLimiter("test")
+    async def main():
+        for _ in range(1000):
+            await unlimited.acquire(10_000)
+    asyncio.run(main())
+    assert not unlimited.enabled
+
+def test_burst_is_admitted_without_waiting():
+    bursty = limiter(per_second=10, burst_seconds=1)
+    async def main():
+        for _ in range(10):
+            await bursty.acquire()
+    asyncio.run(main())
+    assert bursty.admitted == 10
+    assert bursty.wait_seconds == 0
+
+def test_rejects_when_the_wait_exceeds_max_wait():
+    slow = limiter(per_second=1, max_wait=0.1)
+    async def main():
+        await slow.acquire()
+        await slow.acquire()
+    with pytest.raises(RateLimited) as error:
+        asyncio.run(main())
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "1"
+    assert slow.rejected == 1
+
+def test_rejects_when_the_queue_is_full():
+    full = limiter(per_second=1, max_queue=0)
+    async def main():
+        await full.acquire()
+        await full.acquire()
+    with pytest.raises(RateLimited):
+        asyncio.run(main())
+
+def test_queued_callers_are_admitted_in_arrival_order():
+    queued = limiter(per_second=100, burst_seconds=0.01)
+    order = []
+    async def caller(i):
+        await queued.acquire()
+        order.append(i)
+    async def main():
+        await asyncio.gather(*(caller(i) for i in range(6)))
+    asyncio.run(main())
+    assert order == list(range(6))
+    assert queued.wait_seconds > 0
+    assert queued.waiting == 0
+
+def test_oversized_requests_wait_for_a_full_bucket():
+    tokens = limiter(tokens_per_second=1000, burst_seconds=0.05)
+    async def main():
+        await tokens.acquire(500)
+        await asyncio.wait_for(tokens.acquire(500), timeout=1)
+    asyncio.run(main())
+    assert tokens.admitted == 2
+
+def test_settle_charges_the_real_usage():
+    tokens = limiter(tokens_per_second=1, burst_seconds=100)
+    tokens.settle(estimated=10, actual=40)
+    assert tokens.tokens.level == pytest.approx(70, abs=0.1)
+
+def test_cancelled_waiter_leaves_the_queue():
+    queued = limiter(per_second=1, max_wait=5)
+    async def main():
+        await queued.acquire()
+        waiter = asyncio.ensure_future(queued.acquire())
+        await asyncio.sleep(0.05)
+        assert queued.waiting == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert queued.waiting == 0
+        assert not queued._lock.locked()
+    asyncio.run(main())
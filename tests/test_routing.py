@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+import routing
+from circuit import BREAKERS, CircuitOpen, HALF_OPEN
+from ratelimit import RateLimited
+from routing import Option, Router
+
+@pytest.fixture(autouse=True)
+def no_exploration(monkeypatch):
+    monkeypatch.setattr(routing, "EXPLORE_RATE", 0.0)
+    monkeypatch.setattr(routing, "HALF_LIFE_SECONDS", 300.0)
+
+def make_router(*options):
+    return Router("test-endpoint", list(options))
+
+def age(option, seconds):
+    option.updated -= seconds
+
+def fail(exc):
+    async def call():
+        raise exc
+    return call
+
+def test_ranks_by_prior_latency_before_any_call():
+    fast = Option("gemini", "fast", cost=0.1, prior_latency=1.0)
+    slow = Option("groq", "slow", cost=0.1, prior_latency=2.0)
+    assert make_router(slow, fast).rank() == [fast, slow]
+
+def test_first_sample_is_averaged_with_the_prior():
+    option = Option("gemini", "m", cost=0.1, prior_latency=1.0)
+    option.record(6.0)
+    assert option.latency == pytest.approx(1.0 + routing.EWMA_ALPHA * 5.0)
+
+def test_failing_option_is_ranked_last():
+    fast = Option("gemini", "fast", cost=0.1, prior_latency=1.0)
+    slow = Option("groq", "slow", cost=0.1, prior_latency=2.0)
+    for _ in range(5):
+        fast.record(None)
+    assert not fast.healthy
+    assert make_router(fast, slow).rank() == [slow, fast]
+
+def test_demoted_option_recovers_as_its_samples_age():
+    fast = Option("gemini", "fast", cost=0.1, prior_latency=1.0)
+    slow = Option("groq", "slow", cost=0.1, prior_latency=2.0)
+    for _ in range(5):
+        fast.record(None)
+    router = make_router(fast, slow)
+    assert router.rank()[0] is slow
+    age(fast, 3 * routing.HALF_LIFE_SECONDS)
+    assert fast.healthy
+    assert router.rank()[0] is fast
+
+def test_slow_samples_fade_back_to_the_prior():
+    option = Option("gemini", "m", cost=0.1, prior_latency=1.0)
+    for _ in range(20):
+        option.record(10.0)
+    assert option.latency > 9.0
+    age(option, 10 * routing.HALF_LIFE_SECONDS)
+    assert option.latency == pytest.approx(1.0, abs=0.01)
+
+def test_error_rate_resets_when_the_breaker_closes():
+    option = Option("gemini", "m", cost=0.1, prior_latency=1.0)
+    for _ in range(5):
+        option.record(None)
+    assert not option.healthy
+    breaker = BREAKERS["gemini"]
+    breaker.state = HALF_OPEN
+    try:
+        breaker.before_call()
+        breaker.record_success(0.01)
+        assert option.error_rate == 0.0
+        assert option.healthy
+        option.record(None)
+        assert option.error_rate == pytest.approx(routing.EWMA_ALPHA)
+    finally:
+        breaker.closed_at = 0.0
+
+@pytest.mark.parametrize("exc", [RateLimited("gemini", 1), CircuitOpen("gemini", 1)])
+def test_local_rejections_are_not_counted(exc):
+    option = Option("gemini", "m", cost=0.1, prior_latency=1.0)
+    router = make_router(option)
+    with pytest.raises(type(exc)):
+        asyncio.run(router.tracked(option, fail(exc))())
+    assert option.calls == 0
+    assert option.error_rate == 0.0
+
+def test_provider_errors_are_counted():
+    option = Option("gemini", "m", cost=0.1, prior_latency=1.0)
+    router = make_router(option)
+    with pytest.raises(ValueError):
+        asyncio.run(router.tracked(option, fail(ValueError("boom")))())
+    assert option.failures == 1
+    assert option.error_rate == pytest.approx(routing.EWMA_ALPHA)
+
+def test_run_falls_back_in_ranked_order():
+    fast = Option("gemini", "fast", cost=0.1, prior_latency=1.0)
+    slow = Option("groq", "slow", cost=0.1, prior_latency=2.0)
+    router = make_router(fast, slow)
+
+    async def answer():
+        return "ok"
+
+    result = asyncio.run(router.run({fast.name: fail(ValueError("boom")), slow.name: answer}))
+    assert result == "ok"
+    assert router.served == {slow.name: 1}
+    assert fast.failures == 1
@@ -0,0 +1,57 @@
+import pytest
+
+import similarity
+from similarity import SimilarityCache
+
+@pytest.mark.parametrize("stored, asked", [
+    ("make a checklist for react hooks", "create checklist react hooks"),
+    ("explain react hooks", "what are react hooks?"),
+    ("what is the difference between tcp and udp", "difference between tcp and udp please"),
+    ("how does c++ move semantics work", "how does c++ move semantic work"),
+])
+def test_rephrased_questions_share_an_answer(stored, asked):
+    cache = SimilarityCache("test")
+    cache.set(stored, "answer")
+    assert cache.get(asked) == "answer"
+
+@pytest.mark.parametrize("stored, asked", [
+    ("solve x^2 - 4 = 0", "solve x^2 + 4 = 0"),
+    ("17 * 23 in binary", "17 - 23 in binary"),
+    ("17*23", "17*24"),
+    ("convert fahrenheit to celsius", "convert celsius to fahrenheit"),
+    ("convert 5 km to miles", "convert 5 miles to km"),
+    ("is 91 a prime number", "is 91 not a prime number"),
+    ("why isn't python compiled", "why is python compiled"),
+    ("react hooks", "vue hooks"),
+])
+def test_different_questions_do_not(stored, asked):
+    cache = SimilarityCache("test")
+    cache.set(stored, "answer")
+    assert cache.get(asked) is None
+
+def test_closest_question_wins():
+    cache = SimilarityCache("test")
+    cache.set("how does c++ move semantics work", "c++")
+    cache.set("how does rust move semantics work", "rust")
+    assert cache.get("how does c++ move semantic work") == "c++"
+    assert cache.stats()["near_hits"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SimilarityCache("test", maxsize=2)
+    cache.set("tcp vs udp", 1)
+    cache.set("python generators", 2)
+    assert cache.get("tcp vs udp") == 1
+    cache.set("rust ownership", 3)
+    assert cache.get("python generators") is None
+    assert cache.get("tcp vs udp") == 1
+    assert cache.get("rust ownership") == 3
+
+def test_expired_entries_are_not_returned(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(similarity.time, "time", lambda: now[0])
+    cache = SimilarityCache("test", ttl=60)
+    cache.set("explain react hooks", "answer")
+    assert cache.get("what are react hooks?") == "answer"
+    now[0] += 61
+    assert cache.get("explain react hooks") is None
+    assert cache.get("what are react hooks?") is None
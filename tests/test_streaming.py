@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from streaming import JsonArrayItems, JsonFieldExtractor, extract_field
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def stream_field(text, field, size):
+    extractor = JsonFieldExtractor(field)
+    deltas = "".join(extractor.feed(chunk) for chunk in chunks(text, size))
+    assert deltas == extractor.value
+    return extractor
+
+VALUES = [
+    "graph TD; A --> B",
+    'line one\nline "two"\ttabbed \\ backslash / slash',
+    "café ∑ √2",
+    "emoji \U0001F600 and \U0001D11E clef",
+]
+
+@pytest.mark.parametrize("value", VALUES)
+@pytest.mark.parametrize("ascii_only", [True, False])
+def test_decodes_the_field_for_every_chunk_size(value, ascii_only):
+    text = json.dumps({"other": "x", "mermaid_syntax": value, "after": 1}, ensure_ascii=ascii_only)
+    for size in range(1, len(text) + 1):
+        extractor = stream_field(text, "mermaid_syntax", size)
+        assert extractor.value == value, size
+        assert extractor.done
+
+def test_unquoted_key_is_accepted():
+    assert stream_field('{result: "42"}', "result", 3).value == "42"
+
+def test_lone_surrogates_are_replaced():
+    for size in range(1, 30):
+        assert stream_field('{"result": "a\\ud83d b \\ude00"}', "result", size).value == "a� b �"
+
+def test_nothing_is_emitted_before_the_field():
+    extractor = JsonFieldExtractor("result")
+    assert extractor.feed('{"steps": "1 + 1", ') == ""
+    assert not extractor.started
+    assert extractor.feed('"result": "2"}') == "2"
+
+def test_extract_field_passes_plain_text_through():
+    assert extract_field('{"mermaid_syntax": "graph TD"}', "mermaid_syntax") == "graph TD"
+    assert extract_field("graph TD", "mermaid_syntax") == "graph TD"
+
+def stream_items(text, size):
+    items = JsonArrayItems()
+    return items, [item for chunk in chunks(text, size) for item in items.feed(chunk)]
+
+ANSWERS = [
+    {"expr": "x", "result": 4, "assign": True},
+    {"expr": "a {b} [c]", "result": "it's \\ \"quoted\" }", "assign": False},
+    {"expr": "x + 1", "result": 5, "assign": False, "steps": {"nested": [1, 2]}},
+]
+
+def test_splits_the_array_into_items_for_every_chunk_size():
+    text = json.dumps(ANSWERS)
+    for size in range(1, len(text) + 1):
+        items, parsed = stream_items(text, size)
+        assert parsed == ANSWERS, size
+        assert items.closed
+
+def test_items_are_returned_as_soon_as_they_close():
+    items = JsonArrayItems()
+    assert items.feed('[{"expr": "1 + 1", "result": 2}, {"expr"') == [{"expr": "1 + 1", "result": 2}]
+    assert items.feed(': "2 + 2", "result": 4}') == [{"expr": "2 + 2", "result": 4}]
+    assert not items.closed
+    assert items.feed("]") == []
+    assert items.closed
+
+def test_python_literal_items_are_accepted():
+    text = "[{'expr': 'x', 'result': 'don\\'t', 'assign': True}]"
+    for size in range(1, len(text) + 1):
+        assert stream_items(text, size)[1] == [{"expr": "x", "result": "don't", "assign": True}], size
+
+def test_text_after_the_array_is_ignored():
+    items, parsed = stream_items('[{"result": 1}] trailing {"result": 2}', 4)
+    assert parsed == [{"result": 1}]
+    assert items.feed('{"result": 3}') == []